@@ -0,0 +1,107 @@
+"""Compare embedding backends on cold start, latency, memory and agreement with the first backend.
+
+Usage:
+    python benchmark_embeddings.py
+    python benchmark_embeddings.py --backends huggingface onnx onnx:onnx/model_qint8_avx512.onnx
+    python benchmark_embeddings.py --chunk-file ../../all_devops_chunks.json --queries 200
+    python benchmark_embeddings.py --model ./all-MiniLM-L6-v2 --backends huggingface onnx:onnx/model_qint8_avx512.onnx
+
+Each backend runs in a fresh process, so cold_start_s covers importing its
+libraries, loading the model and embedding the first query. rss_mb is the
+process's peak resident memory. max_abs_diff and min_cosine compare the
+vectors with those of the first backend listed. --model takes a Hugging
+Face repo or a local copy of one (with its onnx/ exports), for machines
+that cannot reach the Hub.
+"""
+import argparse
+import json
+import multiprocessing
+import resource
+import time
+from itertools import islice
+from typing import List
+
+import numpy as np
+
+from chunk_loader import iter_json_records
+from embedding_backends import EMBEDDING_MODEL, ONNX_MODEL_FILE, make_embeddings
+
+SAMPLE_TEXTS = [
+    "How often should a team deploy to production?",
+    "Continuous integration merges every developer's work into a shared mainline several times a day.",
+    "Mean time to restore measures how long it takes to recover from a failure in production.",
+    "Infrastructure as code keeps server configuration in version control.",
+    "What is the difference between blue-green and canary deployments?",
+]
+
+
+def load_texts(chunk_file: str, count: int) -> List[str]:
+    if not chunk_file:
+        return [SAMPLE_TEXTS[i % len(SAMPLE_TEXTS)] + f" ({i})" for i in range(count)]
+    return [record["content"] for record in islice(iter_json_records(chunk_file), count)]
+
+
+def run_backend(spec: str, model: str, texts: List[str], queries: int, batch_size: int) -> dict:
+    """Benchmark one backend; runs in its own process"""
+    backend, _, model_file = spec.partition(":")
+    started = time.perf_counter()
+    embeddings = make_embeddings(backend, model, onnx_model_file=model_file or ONNX_MODEL_FILE)
+    embeddings.embed_query(texts[0])
+    cold_start = time.perf_counter() - started
+
+    # Per-query timings, as the API embeds one question at a time
+    latencies = []
+    for text in islice(texts, queries):
+        started = time.perf_counter()
+        embeddings.embed_query(text)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    vectors = []
+    for start in range(0, len(texts), batch_size):
+        vectors.extend(embeddings.embed_documents(texts[start:start + batch_size]))
+    batch_seconds = time.perf_counter() - started
+
+    return {
+        "backend": spec,
+        "cold_start_s": round(cold_start, 2),
+        "query_mean_ms": round(float(np.mean(latencies)), 2),
+        "query_p99_ms": round(float(np.percentile(latencies, 99)), 2),
+        "texts_per_second": round(len(texts) / batch_seconds, 1),
+        # ru_maxrss is in KiB on Linux
+        "rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "vectors": vectors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["huggingface", "onnx"],
+                        help="backend, or onnx:<model file> for another ONNX export")
+    parser.add_argument("--model", default=EMBEDDING_MODEL, help="Hugging Face repo or local model directory")
+    parser.add_argument("--chunk-file", help="JSON/JSONL chunk file to embed instead of sample sentences")
+    parser.add_argument("--texts", type=int, default=512)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    texts = load_texts(args.chunk_file, args.texts)
+    print(f"{len(texts)} texts, {args.queries} single queries, batch size {args.batch_size}")
+    baseline = None
+    context = multiprocessing.get_context("spawn")
+    for spec in args.backends:
+        with context.Pool(1) as pool:
+            result = pool.apply(run_backend, (spec, args.model, texts, args.queries, args.batch_size))
+        vectors = np.asarray(result.pop("vectors"), dtype=np.float32)
+        if baseline is None:
+            baseline = vectors
+        result["max_abs_diff"] = round(float(np.abs(vectors - baseline).max()), 6)
+        result["min_cosine"] = round(float(np.min(
+            (vectors * baseline).sum(axis=1)
+            / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(baseline, axis=1))
+        )), 6)
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
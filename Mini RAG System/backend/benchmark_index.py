@@ -0,0 +1,116 @@
+"""Compare FAISS index types and vector storage on latency, recall, memory and disk size.
+
+Usage:
+    python benchmark_index.py --num-vectors 1000000
+    python benchmark_index.py --vectordb vectordb/default --k 5
+    python benchmark_index.py --index-types flat hnsw --params '{"efSearch": 128}'
+    python benchmark_index.py --index-types flat --storage float32 float16 int8
+
+Recall is measured against exact float32 search. memory_mb counts the
+stored vector codes; disk_mb is the size of the index as written to disk.
+"""
+import argparse
+import json
+import time
+
+import faiss
+import numpy as np
+
+import vector_index
+
+
+def synthetic_vectors(count: int, dimension: int, seed: int = 0) -> np.ndarray:
+    """Unit vectors drawn around random topic centres, roughly like sentence embeddings"""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((max(count // 1000, 16), dimension)).astype(np.float32)
+    vectors = centres[rng.integers(0, len(centres), count)]
+    vectors += 0.5 * rng.standard_normal((count, dimension)).astype(np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def saved_vectors(path: str) -> np.ndarray:
+    """Vectors of a saved collection (vectordb/<collection>): its base index plus every delta segment.
+
+    Quantized indexes give back their decoded vectors, not the original embeddings.
+    """
+    # Imported here so synthetic runs do not load langchain
+    from rag_system import RAGSystem
+    # Only the index reader is used; ":memory:" keeps the embedding cache off disk
+    index = RAGSystem(embedding_cache_path=":memory:")._read_index(path, mapped=False)
+    return vector_index.reconstruct_n(index, 0, index.ntotal)
+
+
+def benchmark(index_type: str, storage: str, vectors: np.ndarray, queries: np.ndarray, k: int,
+              params: dict, truth: np.ndarray) -> dict:
+    started = time.perf_counter()
+    index = vector_index.build_trained_index(index_type, vectors, params, storage)
+    vector_index.apply_search_params(index, params)
+    build_seconds = time.perf_counter() - started
+
+    # Per-query timings, as the API searches one question at a time
+    latencies = []
+    found = np.empty((len(queries), k), dtype=np.int64)
+    for i, query in enumerate(queries):
+        started = time.perf_counter()
+        _, found[i] = index.search(query.reshape(1, -1), k)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    recall = np.mean([len(set(found[i]) & set(truth[i])) / k for i in range(len(queries))])
+    return {
+        "index_type": index_type,
+        "storage": storage,
+        "build_s": round(build_seconds, 2),
+        "mean_ms": round(float(np.mean(latencies)), 3),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+        f"recall@{k}": round(float(recall), 4),
+        "memory_mb": round(index.ntotal * vector_index.bytes_per_vector(index) / 1e6, 1),
+        "disk_mb": round(faiss.serialize_index(index).nbytes / 1e6, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectordb", help="benchmark the vectors of a saved collection (e.g. vectordb/default) "
+                                           "instead of synthetic data")
+    parser.add_argument("--num-vectors", type=int, default=100000)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--index-types", nargs="+", default=list(vector_index.INDEX_TYPES))
+    parser.add_argument("--storage", nargs="+", default=list(vector_index.STORAGE_TYPES),
+                        help="vector storage to try with each index type")
+    parser.add_argument("--params", default="{}", help="JSON index parameters, e.g. '{\"nprobe\": 32}'")
+    args = parser.parse_args()
+
+    if args.vectordb:
+        vectors = saved_vectors(args.vectordb)
+    else:
+        vectors = synthetic_vectors(args.num_vectors, args.dimension)
+    # Queries are perturbed copies of stored vectors
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.integers(0, len(vectors), args.queries)].copy()
+    queries += 0.1 * rng.standard_normal(queries.shape).astype(np.float32)
+
+    params = vector_index.index_params(json.loads(args.params))
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, truth = exact.search(queries, args.k)
+
+    print(f"{len(vectors)} vectors, {args.queries} queries, params {params}")
+    for index_type in args.index_types:
+        for storage in args.storage:
+            try:
+                vector_index.check_storage(index_type, storage)
+            except ValueError as e:
+                print(f"{index_type} ({storage}): skipped, {e}")
+                continue
+            needed = vector_index.train_size(index_type, params, storage)
+            if needed > len(vectors):
+                print(f"{index_type} ({storage}): skipped, needs {needed} vectors to train")
+                continue
+            print(json.dumps(benchmark(index_type, storage, vectors, queries, args.k, params, truth)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+import json
+import math
+import os
+import re
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Posting lists: every term's (row, tf) pairs stored contiguously, located via the terms table
+TERMS_FILE = "bm25.terms.json"
+ROWS_FILE = "bm25.rows"
+TFS_FILE = "bm25.tfs"
+DOC_LENGTHS_FILE = "bm25.doclens"
+# Retrievers RAGSystem.get_context can use: embeddings only, BM25 fused with embeddings,
+# or BM25 only. Defined here rather than in rag_system so the API can check requests
+# without loading langchain and FAISS.
+SEARCH_MODES = ("vector", "hybrid", "lexical")
+# Keeps error codes, versions and hyphenated product names as single tokens
+TOKEN_PATTERN = re.compile(r"\w+(?:[-./]\w+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25Index:
+    """Sparse inverted index over chunk rows, scored with Okapi BM25.
+
+    Saved posting lists are memory-mapped; rows added since loading live in
+    small in-memory posting lists and are persisted as JSON segments until
+    the next full save consolidates everything.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._terms = {}
+        self._rows = np.zeros(0, dtype=np.int32)
+        self._tfs = np.zeros(0, dtype=np.uint16)
+        self._delta = defaultdict(lambda: (array("i"), array("H")))
+        self._doc_lengths = array("i")
+        self._total_length = 0
+        # Postings of rows added since the last save, as {term: tf} per row
+        self._unsaved = []
+
+    def __len__(self) -> int:
+        return len(self._doc_lengths)
+
+    def add(self, start_row: int, texts: List[str]):
+        """Index texts as rows start_row, start_row + 1, ..."""
+        if start_row != len(self):
+            raise ValueError(f"BM25 rows must be added in order; got {start_row}, expected {len(self)}")
+        for text in texts:
+            counts = Counter(tokenize(text))
+            self._add_row(counts)
+            self._unsaved.append(counts)
+
+    def truncate(self, count: int):
+        """Drop the rows from count on; only rows added since the last save can be dropped"""
+        dropped = len(self) - count
+        if dropped <= 0:
+            return
+        if dropped > len(self._unsaved):
+            raise ValueError(f"Rows before {len(self) - len(self._unsaved)} are saved and cannot be dropped")
+        # Delta postings are in row order, so the dropped rows are at the end of each list
+        for term in list(self._delta):
+            rows, tfs = self._delta[term]
+            keep = bisect_left(rows, count)
+            if keep:
+                del rows[keep:]
+                del tfs[keep:]
+            else:
+                del self._delta[term]
+        self._total_length -= sum(self._doc_lengths[count:])
+        del self._doc_lengths[count:]
+        del self._unsaved[-dropped:]
+
+    def _add_row(self, counts: Dict[str, int]):
+        row = len(self._doc_lengths)
+        length = sum(counts.values())
+        self._doc_lengths.append(length)
+        self._total_length += length
+        for term, tf in counts.items():
+            rows, tfs = self._delta[term]
+            rows.append(row)
+            tfs.append(min(tf, 65535))
+
+    def _postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        rows, tfs = [], []
+        location = self._terms.get(term)
+        if location is not None:
+            start, count = location
+            rows.append(self._rows[start:start + count])
+            tfs.append(self._tfs[start:start + count])
+        if term in self._delta:
+            delta_rows, delta_tfs = self._delta[term]
+            rows.append(np.frombuffer(delta_rows, dtype=np.int32))
+            tfs.append(np.frombuffer(delta_tfs, dtype=np.uint16))
+        if not rows:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.uint16)
+        if len(rows) == 1:
+            return rows[0], tfs[0]
+        return np.concatenate(rows), np.concatenate(tfs)
+
+    def search(self, query: str, k: int) -> List[Tuple[int, float]]:
+        """Return the top-k (row, BM25 score) pairs for query, best first"""
+        total = len(self)
+        if not total:
+            return []
+        doc_lengths = np.frombuffer(self._doc_lengths, dtype=np.int32)
+        average_length = self._total_length / total or 1.0
+
+        all_rows, all_scores = [], []
+        for term in set(tokenize(query)):
+            rows, tfs = self._postings(term)
+            if not len(rows):
+                continue
+            idf = math.log(1 + (total - len(rows) + 0.5) / (len(rows) + 0.5))
+            tf = tfs.astype(np.float32)
+            norm = self.k1 * (1 - self.b + self.b * doc_lengths[rows] / average_length)
+            all_rows.append(rows)
+            all_scores.append(idf * tf * (self.k1 + 1) / (tf + norm))
+        if not all_rows:
+            return []
+
+        rows, inverse = np.unique(np.concatenate(all_rows), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(all_scores))
+        top = np.argsort(-scores)[:k] if len(scores) <= k else np.argpartition(-scores, k)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(rows[i]), float(scores[i])) for i in top]
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        return os.path.exists(os.path.join(path, TERMS_FILE))
+
+    def save(self, path: str):
+        """Write consolidated posting lists for every row"""
+        terms = sorted(set(self._terms) | set(self._delta))
+        table, row_parts, tf_parts = {}, [], []
+        offset = 0
+        for term in terms:
+            rows, tfs = self._postings(term)
+            table[term] = [offset, len(rows)]
+            row_parts.append(rows)
+            tf_parts.append(tfs)
+            offset += len(rows)
+        rows = np.concatenate(row_parts) if row_parts else np.zeros(0, dtype=np.int32)
+        tfs = np.concatenate(tf_parts) if tf_parts else np.zeros(0, dtype=np.uint16)
+
+        files = {
+            ROWS_FILE: rows.astype(np.int32).tobytes(),
+            TFS_FILE: tfs.astype(np.uint16).tobytes(),
+            DOC_LENGTHS_FILE: self._doc_lengths.tobytes(),
+        }
+        for name, data in files.items():
+            with open(os.path.join(path, name + ".tmp"), "wb") as f:
+                f.write(data)
+        with open(os.path.join(path, TERMS_FILE + ".tmp"), "w") as f:
+            json.dump(table, f, separators=(",", ":"))
+        # The terms table goes last; it is what marks the index as present
+        for name in (*files, TERMS_FILE):
+            os.replace(os.path.join(path, name + ".tmp"), os.path.join(path, name))
+
+        self._unsaved = []
+        self._load_base(path)
+
+    def save_delta(self, segment_file: str):
+        """Write the postings of rows added since the last save as a JSON segment"""
+        start = len(self) - len(self._unsaved)
+        with open(segment_file + ".tmp", "w") as f:
+            json.dump({"start": start, "rows": self._unsaved}, f, separators=(",", ":"))
+        os.replace(segment_file + ".tmp", segment_file)
+        self._unsaved = []
+
+    @classmethod
+    def load(cls, path: str, segment_files: List[str], count: int) -> Optional["BM25Index"]:
+        """Map the saved posting lists and replay segments up to count rows.
+
+        Returns None when the saved index does not cover count rows (for
+        example after an interrupted save), so the caller can rebuild it.
+        """
+        index = cls()
+        if os.path.getsize(os.path.join(path, DOC_LENGTHS_FILE)) // 4 > count:
+            return None
+        index._load_base(path)
+        for segment_file in segment_files:
+            with open(segment_file) as f:
+                segment = json.load(f)
+            for offset, counts in enumerate(segment["rows"]):
+                # Rows past count come from a save that never finished
+                if segment["start"] + offset == len(index) and len(index) < count:
+                    index._add_row(counts)
+        if len(index) != count:
+            return None
+        return index
+
+    def _load_base(self, path: str):
+        with open(os.path.join(path, TERMS_FILE)) as f:
+            self._terms = json.load(f)
+        if os.path.getsize(os.path.join(path, ROWS_FILE)):
+            self._rows = np.memmap(os.path.join(path, ROWS_FILE), dtype=np.int32, mode="r")
+            self._tfs = np.memmap(os.path.join(path, TFS_FILE), dtype=np.uint16, mode="r")
+        else:
+            self._rows = np.zeros(0, dtype=np.int32)
+            self._tfs = np.zeros(0, dtype=np.uint16)
+        self._delta = defaultdict(lambda: (array("i"), array("H")))
+        self._doc_lengths = array("i")
+        with open(os.path.join(path, DOC_LENGTHS_FILE), "rb") as f:
+            self._doc_lengths.frombytes(f.read())
+        self._total_length = int(sum(self._doc_lengths))
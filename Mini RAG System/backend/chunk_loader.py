@@ -0,0 +1,72 @@
+import json
+from typing import IO, Iterator
+
+from langchain_core.documents import Document
+
+# Bytes read from disk per step; one record is never split across reads
+READ_SIZE = 1024 * 1024
+
+
+def _skip_separators(buffer: str, pos: int) -> int:
+    while pos < len(buffer) and (buffer[pos].isspace() or buffer[pos] == ","):
+        pos += 1
+    return pos
+
+
+def _iter_array(f: IO[str], buffer: str) -> Iterator[dict]:
+    """Decode the elements of a top-level JSON array one at a time"""
+    decoder = json.JSONDecoder()
+    pos = buffer.index("[") + 1
+    eof = False
+    while True:
+        pos = _skip_separators(buffer, pos)
+        if pos < len(buffer) and buffer[pos] == "]":
+            return
+        try:
+            if pos >= len(buffer):
+                raise json.JSONDecodeError("Need more data", buffer, pos)
+            record, pos = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            # The record runs past the end of the buffer: read on, dropping what was consumed
+            if eof:
+                raise
+            data = f.read(READ_SIZE)
+            eof = not data
+            buffer = buffer[pos:] + data
+            pos = 0
+            continue
+        yield record
+
+
+def iter_json_records(path: str) -> Iterator[dict]:
+    """Stream records from a JSON array file or a JSONL file without loading it whole"""
+    with open(path, encoding="utf-8") as f:
+        buffer = ""
+        while not buffer.strip():
+            data = f.read(READ_SIZE)
+            if not data:
+                return
+            buffer += data
+        if buffer.lstrip().startswith("["):
+            yield from _iter_array(f, buffer)
+            return
+
+        # JSON Lines: one record per line
+        remainder = ""
+        while buffer:
+            lines = (remainder + buffer).split("\n")
+            remainder = lines.pop()
+            for line in lines:
+                if line.strip():
+                    yield json.loads(line)
+            buffer = f.read(READ_SIZE)
+        if remainder.strip():
+            yield json.loads(remainder)
+
+
+def record_to_document(record: dict, text_key: str = "content") -> Document:
+    """Chunk text from text_key; every other field (id, title, source_doc, ...) becomes metadata"""
+    if text_key not in record:
+        raise ValueError(f"Chunk record {record.get('id', '?')} has no {text_key!r} field")
+    metadata = {key: value for key, value in record.items() if key != text_key}
+    return Document(page_content=record[text_key], metadata=metadata)
@@ -0,0 +1,252 @@
+import json
+import mmap
+import os
+from typing import Dict, Iterator, List, NamedTuple, Optional, Union
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_community.vectorstores import FAISS
+
+# Chunk text: UTF-8 blob plus int64 offsets (row i spans offsets[i]:offsets[i + 1])
+TEXT_BLOB = "chunks.blob"
+TEXT_OFFSETS = "chunks.offsets"
+# Metadata side table: one compact JSON object per row, laid out the same way
+META_BLOB = "chunks.meta"
+META_OFFSETS = "chunks.meta.offsets"
+STORE_FILES = (TEXT_BLOB, TEXT_OFFSETS, META_BLOB, META_OFFSETS)
+# Row numbers double as FAISS positions and saved offsets, so rows are never removed one by one
+APPEND_ONLY = "Collections are append-only; clear or drop the collection to remove chunks"
+
+
+class _Column:
+    """One memory-mapped variable-length column: a blob and its offsets"""
+
+    def __init__(self, blob_path: str, offsets_path: str, count: int):
+        self.offsets = np.memmap(offsets_path, dtype=np.int64, mode="r", shape=(count + 1,)) if count else None
+        self.blob = None
+        self._file = None
+        if count and self.offsets[count] > 0:
+            self._file = open(blob_path, "rb")
+            self.blob = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def get(self, row: int) -> bytes:
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        return self.blob[start:end] if end > start else b""
+
+
+def _append_column(blob_path: str, offsets_path: str, count: int, values: List[bytes]):
+    """Append values after the first count rows of a column, dropping anything past them"""
+    if count:
+        offsets = np.fromfile(offsets_path, dtype=np.int64, count=count + 1)
+    else:
+        offsets = np.zeros(1, dtype=np.int64)
+    end = int(offsets[-1])
+    # Rows beyond count belong to an interrupted save and are overwritten
+    with open(blob_path, "ab") as f:
+        f.truncate(end)
+        for value in values:
+            f.write(value)
+    new_offsets = end + np.cumsum([len(value) for value in values], dtype=np.int64)
+    # Offsets go last: they decide how many rows the column has
+    with open(offsets_path, "ab") as f:
+        if count:
+            f.truncate((count + 1) * 8)
+        else:
+            f.truncate(0)
+            f.write(offsets.tobytes())
+        f.write(new_offsets.tobytes())
+
+
+class _Rows(NamedTuple):
+    """What a lookup reads: the saved columns, how many rows they hold, and the rows added since.
+
+    Replaced as one object on every save, so a search running outside the
+    index lock never pairs the row count of one save with the columns of another.
+    """
+    persisted: int
+    text: Optional[_Column]
+    meta: Optional[_Column]
+    pending: List[Document]
+
+
+def _map_rows(path: str, count: int) -> _Rows:
+    return _Rows(
+        count,
+        _Column(os.path.join(path, TEXT_BLOB), os.path.join(path, TEXT_OFFSETS), count),
+        _Column(os.path.join(path, META_BLOB), os.path.join(path, META_OFFSETS), count),
+        [],
+    )
+
+
+def _encode_metadata(metadata: dict) -> bytes:
+    return json.dumps(metadata, separators=(",", ":"), default=str).encode("utf-8")
+
+
+class ChunkStore(Docstore, AddableMixin):
+    """Columnar chunk store used as the FAISS docstore in place of a pickled dict.
+
+    Saved rows are memory-mapped, so opening a store costs the same however
+    much text it holds, and a search only decodes the rows it returns. Row
+    numbers are the docstore ids, so they always match FAISS positions.
+    Rows added since the last save are held in memory until append_to.
+    Rows cannot be deleted: delete raises ValueError.
+    """
+
+    def __init__(self):
+        self.path = None
+        self._rows = _Rows(0, None, None, [])
+
+    @classmethod
+    def open(cls, path: str, count: int) -> "ChunkStore":
+        """Map the first count rows of the store saved at path"""
+        store = cls()
+        store.path = path
+        store._rows = _map_rows(path, count)
+        return store
+
+    @staticmethod
+    def saved_count(path: str) -> Optional[int]:
+        """Number of rows saved at path, or None when there is no store there"""
+        offsets_path = os.path.join(path, TEXT_OFFSETS)
+        if not os.path.exists(offsets_path):
+            return None
+        return max(os.path.getsize(offsets_path) // 8 - 1, 0)
+
+    def __len__(self) -> int:
+        rows = self._rows
+        return rows.persisted + len(rows.pending)
+
+    def search(self, search: str) -> Union[str, Document]:
+        row = int(search)
+        rows = self._rows
+        if 0 <= row < rows.persisted:
+            return Document(
+                page_content=rows.text.get(row).decode("utf-8"),
+                metadata=json.loads(rows.meta.get(row) or b"{}"),
+            )
+        if rows.persisted <= row < rows.persisted + len(rows.pending):
+            return rows.pending[row - rows.persisted]
+        return f"ID {search} not found."
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        expected = len(self)
+        for doc_id, doc in texts.items():
+            if str(doc_id) != str(expected):
+                raise ValueError(f"ChunkStore ids must be consecutive row numbers; got {doc_id}, expected {expected}")
+            self._rows.pending.append(doc)
+            expected += 1
+
+    def delete(self, ids: List) -> None:
+        raise ValueError(APPEND_ONLY)
+
+    def truncate(self, count: int):
+        """Drop the rows from count on; only rows added since the last save can be dropped"""
+        rows = self._rows
+        if count < rows.persisted:
+            raise ValueError(f"Rows before {rows.persisted} are saved and cannot be dropped")
+        del rows.pending[count - rows.persisted:]
+
+    def next_ids(self, count: int) -> List[str]:
+        """Docstore ids for the next count rows"""
+        return [str(row) for row in range(len(self), len(self) + count)]
+
+    def iter_documents(self) -> Iterator[Document]:
+        for row in range(len(self)):
+            yield self.search(str(row))
+
+    def save(self, path: str):
+        """Persist to path: append only the new rows when this store already lives there,
+        otherwise write every row to fresh files swapped in atomically"""
+        if self.path is not None and os.path.abspath(self.path) == os.path.abspath(path):
+            self.append_to(path)
+            return
+
+        tmp_paths = {name: os.path.join(path, name + ".tmp") for name in STORE_FILES}
+        for tmp_path in tmp_paths.values():
+            open(tmp_path, "wb").close()
+        # Write in slices so a large store is never fully decoded at once
+        rows = self.iter_documents()
+        written = 0
+        while written < len(self):
+            batch = [next(rows) for _ in range(min(10000, len(self) - written))]
+            _append_column(tmp_paths[TEXT_BLOB], tmp_paths[TEXT_OFFSETS], written,
+                           [doc.page_content.encode("utf-8") for doc in batch])
+            _append_column(tmp_paths[META_BLOB], tmp_paths[META_OFFSETS], written,
+                           [_encode_metadata(doc.metadata) for doc in batch])
+            written += len(batch)
+        for name in (TEXT_BLOB, META_BLOB, META_OFFSETS, TEXT_OFFSETS):
+            os.replace(tmp_paths[name], os.path.join(path, name))
+        self._reopen(path)
+
+    def append_to(self, path: str):
+        """Append the rows added since the last save to the store at path"""
+        rows = self._rows
+        if not rows.pending:
+            return
+        _append_column(os.path.join(path, META_BLOB), os.path.join(path, META_OFFSETS),
+                       rows.persisted, [_encode_metadata(doc.metadata) for doc in rows.pending])
+        _append_column(os.path.join(path, TEXT_BLOB), os.path.join(path, TEXT_OFFSETS),
+                       rows.persisted, [doc.page_content.encode("utf-8") for doc in rows.pending])
+        self._reopen(path)
+
+    def _reopen(self, path: str):
+        # Map the new columns first; the single assignment then swaps every field at once
+        rows = _map_rows(path, len(self))
+        self.path = path
+        self._rows = rows
+
+
+class RowIds:
+    """index_to_docstore_id for a ChunkStore: FAISS position i maps to id str(i).
+
+    Stands in for the dict LangChain keeps, which would otherwise hold one
+    string per vector in memory.
+    """
+
+    def __init__(self, count: int = 0):
+        self._count = count
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, i) -> str:
+        i = int(i)
+        if not 0 <= i < self._count:
+            raise KeyError(i)
+        return str(i)
+
+    def __contains__(self, i) -> bool:
+        return 0 <= int(i) < self._count
+
+    def __iter__(self):
+        return iter(range(self._count))
+
+    def keys(self):
+        return range(self._count)
+
+    def values(self):
+        return (str(i) for i in range(self._count))
+
+    def items(self):
+        return ((i, str(i)) for i in range(self._count))
+
+    def truncate(self, count: int):
+        self._count = min(self._count, count)
+
+    def update(self, mapping: dict):
+        for i in sorted(mapping):
+            if i != self._count or str(mapping[i]) != str(i):
+                raise ValueError(f"RowIds only maps position i to id str(i); got {i} -> {mapping[i]}")
+            self._count += 1
+
+
+class ChunkStoreFAISS(FAISS):
+    """LangChain's FAISS vector store over a ChunkStore and RowIds.
+
+    FAISS.delete removes the vectors before asking the docstore to delete the
+    chunks, so it is refused here, before the index is touched.
+    """
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs) -> Optional[bool]:
+        raise ValueError(APPEND_ONLY)
@@ -0,0 +1,183 @@
+import logging
+import os
+import re
+import shutil
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Callable, List
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: no cross-process write lock, so run a single writer there
+    fcntl = None
+
+if TYPE_CHECKING:
+    # Importing rag_system loads langchain and FAISS; the factory does that on first use
+    from rag_system import RAGSystem
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_COLLECTION = "default"
+# Collection names double as directory names
+COLLECTION_NAME = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+LOCK_FILE = re.compile(r"^\.[A-Za-z0-9_-]{1,64}\.lock$")
+
+
+class CollectionLoadError(Exception):
+    """A collection exists but what is saved on disk could not be loaded"""
+
+
+def validate_name(name: str):
+    """Raise ValueError unless name can be used as a collection (and directory) name"""
+    if not COLLECTION_NAME.match(name):
+        raise ValueError("Collection names may only contain letters, digits, '-' and '_' (max 64)")
+
+
+class CollectionManager:
+    """Named vector stores, each with its own index, chunk store and query cache.
+
+    Every collection lives in root/<name>. Collections are loaded on first
+    use and the least recently used ones are dropped from memory once the
+    loaded indexes exceed memory_budget bytes; they reload from disk when
+    next needed.
+    """
+
+    def __init__(self, root: str, factory: Callable[[], "RAGSystem"], memory_budget: int):
+        self.root = root
+        self.factory = factory
+        self.memory_budget = memory_budget
+        self._loaded = OrderedDict()
+        self._lock = threading.RLock()
+        os.makedirs(root, exist_ok=True)
+
+    def migrate_single_index(self):
+        """Move an index saved directly under root (before collections existed) into the default collection.
+
+        This writes to root, so only writers call it (the API server that runs
+        ingest jobs, and ingest.py), under the default collection's write lock.
+        """
+        from rag_system import INDEX_FILE
+        with self.write_lock(DEFAULT_COLLECTION):
+            if not os.path.exists(os.path.join(self.root, INDEX_FILE)):
+                return
+            target = self.path(DEFAULT_COLLECTION)
+            os.makedirs(target, exist_ok=True)
+            for name in os.listdir(self.root):
+                source = os.path.join(self.root, name)
+                # Write lock files stay in root (see write_lock)
+                if source != target and not LOCK_FILE.match(name):
+                    shutil.move(source, os.path.join(target, name))
+            logger.info(f"Moved existing vector database into collection {DEFAULT_COLLECTION!r}")
+
+    def validate(self, name: str):
+        validate_name(name)
+
+    def path(self, name: str) -> str:
+        self.validate(name)
+        return os.path.join(self.root, name)
+
+    def exists(self, name: str) -> bool:
+        return os.path.isdir(self.path(name))
+
+    def create(self, name: str):
+        os.makedirs(self.path(name), exist_ok=True)
+
+    def get(self, name: str, create: bool = False) -> "RAGSystem":
+        """Return the collection's RAGSystem, loading it from disk if needed.
+
+        Raises ValueError for invalid names, KeyError for unknown collections
+        unless create is set, and CollectionLoadError when the saved index or
+        chunk store cannot be read.
+        """
+        path = self.path(name)
+        with self._lock:
+            if not os.path.isdir(path):
+                if not create:
+                    raise KeyError(name)
+                os.makedirs(path, exist_ok=True)
+            rag_system = self._loaded.get(name)
+            if rag_system is None:
+                rag_system = self.factory()
+                self._loaded[name] = rag_system
+                logger.info(f"Loaded collection {name!r}")
+            self._loaded.move_to_end(name)
+        # First call loads synchronously; later calls are a cheap version check
+        try:
+            rag_system.refresh_vectordb(path)
+        except Exception as e:
+            raise CollectionLoadError(f"Collection {name} could not be loaded: {e}") from e
+        self.enforce_budget()
+        return rag_system
+
+    @contextmanager
+    def write_lock(self, name: str):
+        """Hold the collection's cross-process write lock (a flock on root/.<name>.lock).
+
+        Every process that appends to or deletes a collection takes it, so two
+        writers (the server and ingest.py) never interleave saves.
+        """
+        self.validate(name)
+        if fcntl is None:
+            yield
+            return
+        # Kept outside the collection directory, which drop deletes
+        with open(os.path.join(self.root, f".{name}.lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def is_loaded(self, name: str) -> bool:
+        with self._lock:
+            return name in self._loaded
+
+    def enforce_budget(self):
+        """Unload least recently used collections until the loaded ones fit the memory budget"""
+        with self._lock:
+            usage = sum(rag_system.memory_usage() for rag_system in self._loaded.values())
+            # The most recently used collection always stays
+            for name in list(self._loaded)[:-1]:
+                if usage <= self.memory_budget:
+                    break
+                rag_system = self._loaded[name]
+                if rag_system.has_unsaved_changes():
+                    continue
+                usage -= rag_system.memory_usage()
+                del self._loaded[name]
+                logger.info(f"Unloaded collection {name!r} to stay within the memory budget")
+
+    def list(self) -> List[dict]:
+        with self._lock:
+            names = sorted(
+                name for name in os.listdir(self.root)
+                if COLLECTION_NAME.match(name) and os.path.isdir(os.path.join(self.root, name))
+            )
+            return [
+                {
+                    "name": name,
+                    "loaded": name in self._loaded,
+                    "chunks": self._loaded[name].vectordb.index.ntotal
+                    if name in self._loaded and self._loaded[name].vectordb is not None else None,
+                    "memory_bytes": self._loaded[name].memory_usage() if name in self._loaded else 0,
+                }
+                for name in names
+            ]
+
+    def drop(self, name: str):
+        """Delete a collection from memory and disk"""
+        path = self.path(name)
+        with self.write_lock(name), self._lock:
+            if not os.path.isdir(path):
+                raise KeyError(name)
+            rag_system = self._loaded.pop(name, None)
+            if rag_system is not None:
+                rag_system.reset()
+            shutil.rmtree(path)
+
+    def clear(self, name: str):
+        """Empty a collection but keep it"""
+        self.drop(name)
+        self.create(name)
@@ -0,0 +1,142 @@
+from typing import Callable, Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+# Without start offsets, two chunks only count as overlapping when they share at least this many characters
+MIN_TEXT_OVERLAP = 20
+
+
+def approximate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token) when no tokenizer is available"""
+    return (len(text) + 3) // 4
+
+
+def token_counter(embeddings: Embeddings) -> Callable[[str], int]:
+    """Count tokens with the embedding model's local tokenizer, if it exposes one.
+
+    This is not Gemini's tokenizer, but subword counts from either are
+    close enough to size a context budget. The tokenizer is looked up on the
+    first count, so a lazily loaded model is not loaded any earlier.
+    """
+    counter = None
+
+    def count_tokens(text: str) -> int:
+        nonlocal counter
+        if counter is None:
+            counter = getattr(embeddings, "count_tokens", None)
+            if counter is None:
+                tokenizer = getattr(getattr(embeddings, "client", None), "tokenizer", None)
+                if tokenizer is None:
+                    counter = approximate_tokens
+                else:
+                    counter = lambda text: len(tokenizer.encode(text, add_special_tokens=False)) if text else 0
+        return counter(text)
+
+    return count_tokens
+
+
+def _text_overlap(first: str, second: str) -> int:
+    """Length of the longest suffix of first that is also a prefix of second"""
+    for size in range(min(len(first), len(second)), MIN_TEXT_OVERLAP - 1, -1):
+        if first.endswith(second[:size]):
+            return size
+    return 0
+
+
+def _merge(first: Tuple[Optional[int], str], second: Tuple[Optional[int], str]) -> Optional[Tuple[Optional[int], str]]:
+    """Join two chunks of the same page if they overlap or touch, else None"""
+    first_start, first_text = first
+    second_start, second_text = second
+    if first_start is not None and second_start is not None:
+        overlap = first_start + len(first_text) - second_start
+        if overlap < 0:
+            return None
+    else:
+        overlap = _text_overlap(first_text, second_text)
+        if not overlap:
+            return None
+    if overlap >= len(second_text):
+        return first
+    return first_start, first_text + second_text[overlap:]
+
+
+class ContextPacker:
+    """Fill a token budget with retrieved chunks, best first.
+
+    Chunks from the same page (or split record) are kept together, sorted
+    by their start offset ("start_index" metadata), and overlapping or
+    adjacent chunks are merged so the splitter's overlap is only sent once.
+    Each chunk costs the tokens it adds to its page's merged text; chunks
+    that no longer fit are skipped in favour of smaller, lower ranked ones.
+    If not even one chunk fits, the best one is cut to the budget.
+    """
+
+    def __init__(self, count_tokens: Callable[[str], int], separator: str = "\n\n"):
+        self.count_tokens = count_tokens
+        self.separator = separator
+
+    def _render(self, chunks: List[Tuple[Optional[int], str]]) -> str:
+        # Chunks without offsets keep their retrieval order after the ones that have them
+        ordered = sorted(chunks, key=lambda chunk: (chunk[0] is None, chunk[0] or 0))
+        pieces = []
+        for chunk in ordered:
+            merged = _merge(pieces[-1], chunk) if pieces else None
+            if merged is not None:
+                pieces[-1] = merged
+            else:
+                pieces.append(chunk)
+        return self.separator.join(text for _, text in pieces)
+
+    def pack(self, docs: List[Document], token_budget: int) -> Tuple[str, int]:
+        """Return the packed context for docs (best first) and its token count"""
+        groups: Dict[tuple, List[Tuple[Optional[int], str]]] = {}
+        rendered: Dict[tuple, str] = {}
+        seen = set()
+        separator_tokens = self.count_tokens(self.separator)
+        used = 0
+
+        for i, doc in enumerate(docs):
+            text = doc.page_content
+            if not text.strip() or text in seen:
+                continue
+            metadata = doc.metadata
+            if "page" in metadata or "start_index" in metadata:
+                # A PDF page, or a pre-chunked record that was split further
+                key = (metadata.get("source"), metadata.get("page"), metadata.get("id"))
+            else:
+                key = ("chunk", i)
+            chunks = groups.get(key, []) + [(metadata.get("start_index"), text)]
+            before = rendered.get(key, "")
+            after = self._render(chunks)
+            if after == before:
+                # Already covered by chunks of the same page
+                seen.add(text)
+                continue
+
+            cost = self.count_tokens(after) - self.count_tokens(before)
+            if key not in groups and groups:
+                cost += separator_tokens
+            if used + cost > token_budget:
+                continue
+            used += cost
+            groups[key] = chunks
+            rendered[key] = after
+            seen.add(text)
+
+        if not groups and token_budget > 0:
+            return self._truncate_best(docs, token_budget)
+        # Pages come out in the order of their best chunk
+        return self.separator.join(rendered[key] for key in groups), used
+
+    def _truncate_best(self, docs: List[Document], token_budget: int) -> Tuple[str, int]:
+        """Cut the best chunk down to the budget when not even one chunk fits"""
+        for doc in docs:
+            text = doc.page_content
+            if text.strip():
+                tokens = self.count_tokens(text)
+                while text and tokens > token_budget:
+                    text = text[:len(text) * token_budget // tokens]
+                    tokens = self.count_tokens(text)
+                return text, tokens
+        return "", 0
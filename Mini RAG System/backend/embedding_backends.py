@@ -0,0 +1,172 @@
+import importlib.util
+import logging
+import os
+import threading
+import time
+from typing import Callable, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from context_packer import token_counter
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_BACKENDS = ("huggingface", "onnx")
+# ONNX exports shipped in the model's Hugging Face repo; the quantized ones
+# (e.g. onnx/model_qint8_avx512.onnx, onnx/model_quint8_avx2.onnx) are smaller and faster
+ONNX_MODEL_FILE = "onnx/model.onnx"
+# all-MiniLM-L6-v2 was trained on, and truncates to, 256 word pieces
+MAX_SEQUENCE_LENGTH = 256
+
+
+class OnnxEmbeddings(Embeddings):
+    """Sentence-transformers model run on ONNX Runtime instead of PyTorch.
+
+    Reproduces the model's pipeline (word piece tokenizer, mean pooling over
+    the attention mask, L2 normalisation) with onnxruntime, tokenizers and
+    numpy, so PyTorch is never imported. model_name is a Hugging Face repo
+    or a local directory holding tokenizer.json and model_file.
+    InferenceSession.run is thread-safe, so one instance serves every thread.
+    """
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL, model_file: str = ONNX_MODEL_FILE,
+                 max_length: int = MAX_SEQUENCE_LENGTH, threads: Optional[int] = None):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        self.model_name = model_name
+        self.model_file = model_file
+        tokenizer_path = self._fetch("tokenizer.json")
+        self.tokenizer = Tokenizer.from_file(tokenizer_path)
+        self.tokenizer.enable_truncation(max_length)
+        self.tokenizer.enable_padding()
+        # Untruncated copy for counting tokens of whole contexts
+        self._counting_tokenizer = Tokenizer.from_file(tokenizer_path)
+        self._counting_tokenizer.no_truncation()
+        self._counting_tokenizer.no_padding()
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(
+            self._fetch(model_file), options, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+    def _fetch(self, filename: str) -> str:
+        if os.path.isdir(self.model_name):
+            return os.path.join(self.model_name, filename)
+        from huggingface_hub import hf_hub_download
+        return hf_hub_download(self.model_name, filename)
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        inputs = {
+            "input_ids": np.array([encoding.ids for encoding in encodings], dtype=np.int64),
+            "attention_mask": np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64),
+            "token_type_ids": np.array([encoding.type_ids for encoding in encodings], dtype=np.int64),
+        }
+        token_embeddings = self.session.run(
+            None, {name: value for name, value in inputs.items() if name in self._input_names}
+        )[0]
+        mask = inputs["attention_mask"][..., np.newaxis].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return self._embed(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text])[0].tolist()
+
+    def count_tokens(self, text: str) -> int:
+        return len(self._counting_tokenizer.encode(text, add_special_tokens=False).ids) if text else 0
+
+
+class LazyEmbeddings(Embeddings):
+    """Embeddings built on first use and then shared by every caller.
+
+    Importing and constructing a model (PyTorch alone takes seconds) is
+    deferred until the first text is embedded, so startup stays fast and
+    processes that never embed never pay for it. model_id names the vectors
+    this backend produces, for keying the embedding cache.
+    """
+
+    def __init__(self, factory: Callable[[], Embeddings], backend: str, model_id: str):
+        self.backend = backend
+        self.model_id = model_id
+        self.load_seconds = None
+        self._factory = factory
+        self._model = None
+        self._count_tokens = None
+        self._load_lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    def _get_model(self) -> Embeddings:
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    started = time.perf_counter()
+                    model = self._factory()
+                    self._count_tokens = token_counter(model)
+                    self.load_seconds = time.perf_counter() - started
+                    self._model = model
+                    logger.info(f"Loaded {self.backend} embeddings {self.model_id} in {self.load_seconds:.2f}s")
+        return self._model
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._get_model().embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._get_model().embed_query(text)
+
+    def count_tokens(self, text: str) -> int:
+        self._get_model()
+        return self._count_tokens(text)
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.backend,
+            "model": self.model_id,
+            "loaded": self.loaded,
+            "load_seconds": round(self.load_seconds, 3) if self.load_seconds is not None else None,
+        }
+
+
+def make_embeddings(backend: str = "huggingface", model_name: str = EMBEDDING_MODEL,
+                    onnx_model_file: str = ONNX_MODEL_FILE, threads: Optional[int] = None) -> LazyEmbeddings:
+    """Lazily loaded embeddings for backend ("huggingface" or "onnx").
+
+    threads caps the intra-op threads one embedding call uses. ONNX Runtime
+    sets it per session; PyTorch only has a process-wide setting, so with the
+    huggingface backend it also applies to the reranker.
+    """
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend {backend!r}; expected one of {EMBEDDING_BACKENDS}")
+
+    if backend == "onnx":
+        # ONNX Runtime is an optional dependency; fail now rather than on the first embedding
+        if importlib.util.find_spec("onnxruntime") is None:
+            raise ImportError("The onnx embedding backend needs ONNX Runtime: pip install onnxruntime==1.20.1")
+        # Quantized exports give slightly different vectors, so they get their own cache entries
+        model_id = model_name if onnx_model_file == ONNX_MODEL_FILE else f"{model_name}#{onnx_model_file}"
+        return LazyEmbeddings(
+            lambda: OnnxEmbeddings(model_name, onnx_model_file, threads=threads), backend, model_id
+        )
+
+    def load_huggingface() -> Embeddings:
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        return HuggingFaceEmbeddings(model_name=model_name)
+
+    return LazyEmbeddings(load_huggingface, backend, model_name)
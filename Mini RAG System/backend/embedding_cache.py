@@ -0,0 +1,65 @@
+import hashlib
+import logging
+import sqlite3
+import threading
+from typing import List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCache:
+    """Persistent chunk embedding cache stored in a local SQLite file.
+
+    Vectors are keyed by the SHA-256 of the model name plus the chunk text,
+    so the same text embedded by a different model never collides.
+    """
+
+    def __init__(self, path: str, model_name: str):
+        self.path = path
+        self.model_name = model_name
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+        )
+        self._conn.commit()
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """Return the cached vector for each text, or None where it is missing"""
+        keys = [self._key(text) for text in texts]
+        found = {}
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                )
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+
+            vectors = [found.get(key) for key in keys]
+            hits = sum(vector is not None for vector in vectors)
+            self.hits += hits
+            self.misses += len(vectors) - hits
+        return vectors
+
+    def put_many(self, texts: List[str], vectors: List[List[float]]):
+        """Store vectors for the given texts"""
+        rows = [
+            (self._key(text), np.asarray(vector, dtype=np.float32).tobytes())
+            for text, vector in zip(texts, vectors)
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows
+            )
+            self._conn.commit()
@@ -0,0 +1,172 @@
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+from typing import AsyncIterator, Dict, List, Optional
+
+import httpx
+import numpy as np
+
+DEFAULT_API_ENDPOINT = "https://generativelanguage.googleapis.com"
+API_VERSION = "v1beta"
+
+
+class GeminiError(Exception):
+    """Error response from the Gemini API"""
+
+
+class GenerativeModel:
+    """A model name bound to the shared GeminiClient; cheap to keep per model"""
+
+    def __init__(self, client: "GeminiClient", name: str):
+        self.client = client
+        self.name = name if name.startswith("models/") else f"models/{name}"
+
+    async def generate_content(self, prompt: str) -> str:
+        """Generate a full answer and return its text"""
+        started = time.perf_counter()
+        response = await self.client.http.post(
+            f"/{API_VERSION}/{self.name}:generateContent", json=_request_body(prompt)
+        )
+        self.client.record("headers_ms", started)
+        _raise_for_status(response)
+        text = _response_text(response.json())
+        self.client.record("generate_ms", started)
+        return text
+
+    async def stream_generate_content(self, prompt: str) -> AsyncIterator[str]:
+        """Yield the answer's text as the API streams it"""
+        started = time.perf_counter()
+        async with self.client.http.stream(
+            "POST", f"/{API_VERSION}/{self.name}:streamGenerateContent",
+            params={"alt": "sse"}, json=_request_body(prompt)
+        ) as response:
+            self.client.record("headers_ms", started)
+            if response.status_code >= 400:
+                await response.aread()
+                _raise_for_status(response)
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                text = _response_text(json.loads(line[5:]))
+                if text:
+                    yield text
+        self.client.record("stream_ms", started)
+
+
+class GeminiClient:
+    """Gemini REST client shared by every request.
+
+    One pooled HTTP connection set is created lazily and reused, model
+    handles are kept per name, and the model list is cached for
+    models_ttl seconds. api_endpoint can point at a local stub server.
+    Latencies of recent calls are kept for stats().
+    """
+
+    def __init__(self, api_key: Optional[str], api_endpoint: Optional[str] = None,
+                 models_ttl: float = 300, timeout: float = 60, max_connections: int = 20):
+        self.api_key = api_key
+        self.api_endpoint = (api_endpoint or DEFAULT_API_ENDPOINT).rstrip("/")
+        self.models_ttl = models_ttl
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._http = None
+        self._models = {}
+        self._models_lock = threading.Lock()
+        self._model_list = None
+        self._model_list_expires = 0.0
+        self._model_list_lock = asyncio.Lock()
+        self._timings = {}
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                base_url=self.api_endpoint,
+                headers={"x-goog-api-key": self.api_key or ""},
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+            )
+        return self._http
+
+    def model(self, name: str) -> GenerativeModel:
+        """Return the shared handle for a model name"""
+        model = self._models.get(name)
+        if model is None:
+            with self._models_lock:
+                model = self._models.setdefault(name, GenerativeModel(self, name))
+        return model
+
+    async def list_models(self) -> List[dict]:
+        """Return every model the API key can use, cached for models_ttl seconds"""
+        if self._model_list is not None and time.monotonic() < self._model_list_expires:
+            return self._model_list
+        # Concurrent misses wait for one fetch instead of each calling the API
+        async with self._model_list_lock:
+            if self._model_list is not None and time.monotonic() < self._model_list_expires:
+                return self._model_list
+            started = time.perf_counter()
+            models, page_token = [], None
+            while True:
+                params = {"pageSize": 1000}
+                if page_token:
+                    params["pageToken"] = page_token
+                response = await self.http.get(f"/{API_VERSION}/models", params=params)
+                _raise_for_status(response)
+                page = response.json()
+                models.extend(page.get("models", []))
+                page_token = page.get("nextPageToken")
+                if not page_token:
+                    break
+            self.record("list_models_ms", started)
+            self._model_list = models
+            self._model_list_expires = time.monotonic() + self.models_ttl
+            return models
+
+    def record(self, metric: str, started: float):
+        """Record the milliseconds since started under metric"""
+        timings = self._timings.get(metric)
+        if timings is None:
+            timings = self._timings.setdefault(metric, deque(maxlen=1000))
+        timings.append((time.perf_counter() - started) * 1000)
+
+    def stats(self) -> Dict[str, dict]:
+        """Count, p50 and p95 (ms) of recent calls per metric"""
+        stats = {}
+        for metric, timings in list(self._timings.items()):
+            values = list(timings)
+            stats[metric] = {
+                "count": len(values),
+                "p50": round(float(np.percentile(values, 50)), 1),
+                "p95": round(float(np.percentile(values, 95)), 1),
+            }
+        return stats
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+
+def _request_body(prompt: str) -> dict:
+    return {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+
+
+def _response_text(payload: dict) -> str:
+    candidates = payload.get("candidates") or []
+    if not candidates:
+        return ""
+    parts = (candidates[0].get("content") or {}).get("parts") or []
+    return "".join(part.get("text", "") for part in parts)
+
+
+def _raise_for_status(response: httpx.Response):
+    if response.status_code < 400:
+        return
+    try:
+        message = response.json()["error"]["message"]
+    except (ValueError, KeyError, TypeError):
+        message = response.text
+    raise GeminiError(f"Gemini API returned {response.status_code}: {message}")
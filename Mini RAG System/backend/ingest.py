@@ -0,0 +1,139 @@
+"""Bulk-ingest PDFs and pre-chunked JSON into a collection without going through the API.
+
+Usage:
+    python ingest.py library/                      # every PDF under a directory
+    python ingest.py a.pdf b.pdf --collection docs
+    python ingest.py library/ --processes 8 --batch-size 128
+    python ingest.py ../../all_devops_chunks.json  # JSON array or .jsonl of {"content": ...} records
+
+PDFs are parsed on a process pool, embedded in batches across documents,
+and written with a single save. Chunk files are streamed record by record;
+only records longer than CHUNK_SIZE are split again (see
+RAGSystem.load_chunk_file). Files already in the collection are skipped.
+The collection's write lock is held throughout, so a server uploading to
+it waits and then appends to what was saved here. A running server picks
+the new chunks up on its next request.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+from typing import Iterator, List
+
+from collection_manager import CollectionManager, DEFAULT_COLLECTION
+from embedding_backends import make_embeddings
+from rag_system import RAGSystem
+
+
+# Files ingest.py picks up: PDFs, and chunk files for RAGSystem.load_chunk_file
+PDF_EXTENSIONS = (".pdf",)
+CHUNK_FILE_EXTENSIONS = (".json", ".jsonl")
+
+
+def find_sources(paths: List[str]) -> Iterator[str]:
+    """Expand files and directories (recursively) into PDF and chunk file paths"""
+    extensions = PDF_EXTENSIONS + CHUNK_FILE_EXTENSIONS
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                for name in sorted(names):
+                    if name.lower().endswith(extensions):
+                        yield os.path.join(root, name)
+        elif path.lower().endswith(extensions):
+            yield path
+        else:
+            print(f"Skipping {path}: not a PDF, chunk file or directory", file=sys.stderr)
+
+
+def file_sha256(path: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="+", help="PDF files, JSON/JSONL chunk files and/or directories")
+    parser.add_argument("--collection", default=DEFAULT_COLLECTION)
+    parser.add_argument("--vectordb", default="vectordb", help="directory holding the collections")
+    parser.add_argument("--processes", type=int, default=None, help="parser processes (default: all cores)")
+    parser.add_argument("--batch-size", type=int, default=int(os.getenv("EMBED_BATCH_SIZE", "64")))
+    parser.add_argument("--text-key", default="content", help="chunk text field in JSON records")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("EMBED_WORKERS", "1")),
+                        help="batches embedded at once (default: 1, as each batch already uses every core)")
+    parser.add_argument("--threads", type=int, default=int(os.getenv("EMBED_THREADS", "0")) or None,
+                        help="threads each batch uses (default: every core); lower it when raising --workers")
+    args = parser.parse_args()
+
+    embeddings = make_embeddings(
+        os.getenv("EMBEDDING_BACKEND", "huggingface"),
+        onnx_model_file=os.getenv("ONNX_MODEL_FILE", "onnx/model.onnx"),
+        threads=args.threads
+    )
+
+    def new_rag_system() -> RAGSystem:
+        return RAGSystem(
+            embeddings=embeddings,
+            embed_batch_size=args.batch_size,
+            embed_workers=args.workers,
+            index_type=os.getenv("INDEX_TYPE", "flat"),
+            index_params=json.loads(os.getenv("INDEX_PARAMS", "{}")),
+            storage=os.getenv("INDEX_STORAGE", "float32")
+        )
+
+    collections = CollectionManager(args.vectordb, new_rag_system, memory_budget=0)
+    collections.migrate_single_index()
+    with collections.write_lock(args.collection):
+        ingest(collections.get(args.collection, create=True), collections.path(args.collection), args)
+
+
+def ingest(rag_system: RAGSystem, collection_path: str, args: argparse.Namespace):
+    """Add the files in args.paths to rag_system and save them to collection_path in one go"""
+    file_hashes = {}
+    for path in find_sources(args.paths):
+        file_hash = file_sha256(path)
+        if rag_system.is_ingested(file_hash) or file_hash in file_hashes.values():
+            print(f"Skipping {path}: already ingested")
+            continue
+        file_hashes[path] = file_hash
+    if not file_hashes:
+        print("Nothing to ingest")
+        return
+    pdf_hashes = {path: file_hash for path, file_hash in file_hashes.items() if path.lower().endswith(PDF_EXTENSIONS)}
+    chunk_files = [path for path in file_hashes if path not in pdf_hashes]
+
+    def progress(stage: str, count: int):
+        if stage == "files_processed":
+            print(f"\rParsed {count}/{len(pdf_hashes)} PDFs", end="", flush=True)
+        elif stage == "chunks_embedded":
+            print(f"\rEmbedded {count} chunks" + " " * 20, end="", flush=True)
+
+    added = False
+    if pdf_hashes:
+        outcome = rag_system.process_pdfs(
+            list(pdf_hashes), progress=progress, file_hashes=pdf_hashes, workers=args.processes
+        )
+        print()
+        added = bool(outcome["ingested"])
+        for path, error in outcome["failed"].items():
+            print(f"Failed {path}: {error}", file=sys.stderr)
+        print(json.dumps(outcome["stats"]))
+    for path in chunk_files:
+        try:
+            rag_system.load_chunk_file(path, progress=progress, file_hash=file_hashes[path], text_key=args.text_key)
+        except (ValueError, OSError) as e:
+            print(f"\nFailed {path}: {e}", file=sys.stderr)
+            continue
+        print()
+        added = True
+        print(json.dumps({"file": path, **rag_system.last_ingest_stats}))
+    # One save for everything, so a running server sees it all at once
+    if added:
+        rag_system.save_delta(collection_path)
+
+
+if __name__ == "__main__":
+    main()
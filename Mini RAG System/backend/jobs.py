@@ -0,0 +1,91 @@
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    """Progress and outcome of one background ingestion job"""
+
+    def __init__(self, filename: str):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.status = "queued"
+        # Bulk jobs only: how many of their PDFs have been parsed so far
+        self.files_total = 0
+        self.files_processed = 0
+        self.pages_loaded = 0
+        self.chunks_created = 0
+        self.chunks_embedded = 0
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+
+    def update(self, field: str, value: int):
+        """Progress callback handed to RAGSystem.process_pdf and process_pdfs"""
+        setattr(self, field, value)
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "filename": self.filename,
+            "status": self.status,
+            "files_total": self.files_total,
+            "files_processed": self.files_processed,
+            "pages_loaded": self.pages_loaded,
+            "chunks_created": self.chunks_created,
+            "chunks_embedded": self.chunks_embedded,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobQueue:
+    """In-process job queue backed by a thread pool (no external broker).
+
+    The default single worker also makes it the only writer to the index.
+    """
+
+    def __init__(self, max_workers: int = 1, max_history: int = 1000):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self.max_history = max_history
+
+    def submit(self, filename: str, func: Callable[[Job], Optional[dict]]) -> Job:
+        """Queue func(job) and return the job immediately"""
+        job = Job(filename)
+        with self._lock:
+            self._jobs[job.id] = job
+            # Forget the oldest finished jobs once the history is full
+            while len(self._jobs) > self.max_history:
+                oldest_id, oldest = next(iter(self._jobs.items()))
+                if oldest.status in ("queued", "running"):
+                    break
+                del self._jobs[oldest_id]
+        self._executor.submit(self._run, job, func)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job: Job, func: Callable[[Job], Optional[dict]]):
+        job.status = "running"
+        try:
+            job.result = func(job)
+            job.status = "completed"
+        except Exception as e:
+            logger.error(f"Job {job.id} failed: {str(e)}")
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
@@ -1,23 +1,47 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
-from pydantic import BaseModel
-import google.generativeai as genai
+from fastapi import FastAPI, File, UploadFile, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
 import os
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
-from rag_system import RAGSystem
+from embedding_backends import make_embeddings
+from embedding_cache import EmbeddingCache
+from reranker import CrossEncoderReranker
+from gemini_client import GeminiClient
+from semantic_cache import SemanticCache, context_hash
+from collection_manager import CollectionLoadError, CollectionManager, DEFAULT_COLLECTION, validate_name
+from bm25_index import SEARCH_MODES
+from jobs import Job, JobQueue
+from writer_proxy import WriterProxy, is_write_request
+import metrics
 import tempfile
 import shutil
-from typing import Optional
+import hashlib
+import json
+import logging
+import threading
+import time
+import uuid
+from typing import TYPE_CHECKING, AsyncIterator, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    # langchain and FAISS load with the first collection (see get_collections)
+    from rag_system import RAGSystem
+
+logger = logging.getLogger(__name__)
 
 # Load .env
 load_dotenv()
 api_key = os.getenv("GEMINI_API_KEY")
 
-# Configure Gemini
-genai.configure(api_key=api_key)
-
-# Initialize RAG system
-rag_system = RAGSystem()
+# One Gemini client (and connection pool) for every request; GEMINI_API_ENDPOINT
+# can point at a local stub such as stub_gemini_server.py
+gemini = GeminiClient(
+    api_key=api_key,
+    api_endpoint=os.getenv("GEMINI_API_ENDPOINT"),
+    models_ttl=float(os.getenv("MODELS_CACHE_TTL", "300"))
+)
 
 # Create uploads directory
 UPLOAD_DIR = "uploads"
@@ -25,8 +49,125 @@ VECTORDB_DIR = "vectordb"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 os.makedirs(VECTORDB_DIR, exist_ok=True)
 
+# One embedding model and embedding cache shared by every collection. The model loads on
+# the first embedding; EMBEDDING_BACKEND=onnx runs it on ONNX Runtime without PyTorch
+# (ONNX_MODEL_FILE=onnx/model_qint8_avx512.onnx or onnx/model_quint8_avx2.onnx for int8)
+embeddings = make_embeddings(
+    os.getenv("EMBEDDING_BACKEND", "huggingface"),
+    onnx_model_file=os.getenv("ONNX_MODEL_FILE", "onnx/model.onnx"),
+    threads=int(os.getenv("EMBED_THREADS", "0")) or None
+)
+embedding_cache = EmbeddingCache("embedding_cache.db", embeddings.model_id)
+# Optional cross-encoder reranking of retrieved chunks, enabled by setting RERANK_MODEL
+# (e.g. cross-encoder/ms-marco-MiniLM-L-6-v2)
+reranker = CrossEncoderReranker(
+    model_name=os.getenv("RERANK_MODEL"),
+    batch_size=int(os.getenv("RERANK_BATCH_SIZE", "16")),
+    budget_ms=float(os.getenv("RERANK_BUDGET_MS", "150"))
+) if os.getenv("RERANK_MODEL") else None
+
+def new_rag_system() -> "RAGSystem":
+    """Create the RAG system backing one collection"""
+    from rag_system import RAGSystem
+    return RAGSystem(
+        embed_batch_size=int(os.getenv("EMBED_BATCH_SIZE", "64")),
+        embed_workers=int(os.getenv("EMBED_WORKERS", "1")),
+        query_cache_size=int(os.getenv("QUERY_CACHE_SIZE", "256")),
+        query_cache_ttl=float(os.getenv("QUERY_CACHE_TTL", "300")),
+        index_type=os.getenv("INDEX_TYPE", "flat"),
+        index_params=json.loads(os.getenv("INDEX_PARAMS", "{}")),
+        storage=os.getenv("INDEX_STORAGE", "float32"),
+        mmap=os.getenv("SHARED_INDEX") == "1",
+        embeddings=embeddings,
+        embedding_cache=embedding_cache,
+        reranker=reranker,
+        rerank_candidates=int(os.getenv("RERANK_CANDIDATES", "50")),
+        pack_candidates=int(os.getenv("CONTEXT_CANDIDATES", "20"))
+    )
+
+# Named collections, loaded lazily and unloaded LRU-first beyond the memory budget.
+# Created by get_collections, which is what first imports langchain and FAISS.
+collections = None
+collections_lock = threading.Lock()
+
+def get_collections() -> CollectionManager:
+    global collections
+    if collections is None:
+        with collections_lock:
+            if collections is None:
+                manager = CollectionManager(
+                    VECTORDB_DIR, new_rag_system,
+                    memory_budget=int(os.getenv("COLLECTION_MEMORY_BUDGET_MB", "1024")) * 1024 * 1024
+                )
+                # Readers (see writer below) leave the store to the writer worker
+                if writer is None:
+                    manager.migrate_single_index()
+                collections = manager
+    return collections
+
+# How a worker gets warm: "background" (default) answers /healthz at once and loads the
+# RAG stack, embedding model and default collection on a thread; "eager" does that before
+# serving; "lazy" leaves it all to the first request that needs each piece
+STARTUP_MODE = os.getenv("STARTUP_MODE", "background")
+# Seconds spent in each warm-up stage, reported by /readyz
+warm_up_timings = {}
+warm_up_error = None
+
+def warm_up():
+    """Load everything the first question needs so it does not pay for startup"""
+    global warm_up_error
+    try:
+        started = time.perf_counter()
+        get_collections()
+        warm_up_timings["rag_stack_s"] = round(time.perf_counter() - started, 3)
+        started = time.perf_counter()
+        embeddings.embed_query("warm up")
+        warm_up_timings["embedding_model_s"] = round(time.perf_counter() - started, 3)
+        started = time.perf_counter()
+        get_collections().get(DEFAULT_COLLECTION, create=True)
+        warm_up_timings["default_collection_s"] = round(time.perf_counter() - started, 3)
+    except Exception as e:
+        warm_up_error = str(e)
+        logger.error(f"Warm-up failed: {warm_up_error}")
+
+# Background ingestion; a single worker keeps index writes serialised
+job_queue = JobQueue(max_workers=1)
+# (collection, SHA-256) -> job for uploads that are queued or still being processed
+inflight_uploads = {}
+
+# Uploads are read and hashed in pieces of this size
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+GEMINI_MODEL = "gemini-2.0-flash"
+# Tokens of retrieved context sent with each question
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+# Queries accepted by one /search-batch call; every query is embedded and searched in that request
+MAX_BATCH_QUERIES = int(os.getenv("MAX_BATCH_QUERIES", "256"))
+# Answers reused for paraphrased questions over the same context; SEMANTIC_CACHE_SIZE=0 disables
+semantic_cache = SemanticCache(
+    threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95")),
+    max_entries=int(os.getenv("SEMANTIC_CACHE_SIZE", "1000")),
+    ttl_seconds=float(os.getenv("SEMANTIC_CACHE_TTL", "3600"))
+) if int(os.getenv("SEMANTIC_CACHE_SIZE", "1000")) > 0 else None
+
+# Under serve.py, reader workers get WRITER_SOCKET and pass uploads, job lookups and
+# collection changes to the one writer worker; SHARED_INDEX=1 maps saved indexes read-only
+# so every worker shares them through the page cache
+writer = WriterProxy(os.environ["WRITER_SOCKET"]) if os.getenv("WRITER_SOCKET") else None
+# serve.py also sets METRICS_DIR, where workers share metric snapshots so /metrics covers all of them
+METRICS_DIR = os.getenv("METRICS_DIR")
+metrics_snapshot = None
+
 # FastAPI app setup
 app = FastAPI()
+
+@app.middleware("http")
+async def forward_writes(request: Request, call_next):
+    if writer is not None and is_write_request(request):
+        return await writer.forward(request)
+    return await call_next(request)
+
+# Added last so it wraps forwarded responses too
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Change in production
@@ -34,6 +175,27 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def start_warm_up():
+    if STARTUP_MODE == "eager":
+        await run_in_threadpool(warm_up)
+    elif STARTUP_MODE == "background":
+        threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+
+@app.on_event("startup")
+async def share_metrics():
+    global metrics_snapshot
+    if METRICS_DIR:
+        metrics_snapshot = metrics.share_snapshots(METRICS_DIR)
+
+@app.on_event("shutdown")
+async def close_gemini():
+    await gemini.aclose()
+    if writer is not None:
+        await writer.aclose()
+    if metrics_snapshot is not None:
+        metrics.save_snapshot(metrics_snapshot)
+
 # Pydantic models
 class Prompt(BaseModel):
     message: str
@@ -41,83 +203,374 @@ class Prompt(BaseModel):
 class RAGPrompt(BaseModel):
     message: str
     use_context: bool = True
+    collection: str = DEFAULT_COLLECTION
+    # "vector", "hybrid" (BM25 + vectors) or "lexical" (BM25 only)
+    search_mode: str = "vector"
+    # Context size in tokens; defaults to CONTEXT_TOKEN_BUDGET, 0 sends the top 3 chunks as-is
+    token_budget: Optional[int] = Field(None, ge=0)
+
+class BatchSearch(BaseModel):
+    queries: List[str] = Field(..., max_length=MAX_BATCH_QUERIES)
+    k: int = Field(3, ge=1)
+    collection: str = DEFAULT_COLLECTION
+
+class CollectionRequest(BaseModel):
+    name: str
+
+async def get_collection(name: str, create: bool = False) -> "RAGSystem":
+    """Look up a collection for an endpoint; the default collection always exists.
+
+    Runs on the thread pool: the first lookup imports langchain and FAISS (or
+    waits for warm-up to), and a collection not in memory loads from disk.
+    A collection that fails to load is a server error, not a bad request.
+    """
+    try:
+        validate_name(name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        return await run_in_threadpool(
+            lambda: get_collections().get(name, create=create or name == DEFAULT_COLLECTION)
+        )
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Collection {name} not found")
+    except CollectionLoadError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def build_prompt(message: str, context: str) -> str:
+    """Wrap the question with retrieved context, if there is any"""
+    if not context:
+        return message
+    return f"""
+Context from documents:
+{context}
+
+Question: {message}
+
+Please answer the question based on the provided context. If the context doesn't contain relevant information, you can provide a general answer but mention that it's not based on the uploaded documents.
+"""
+
+async def retrieve_context(prompt: RAGPrompt) -> Tuple[Optional[List[float]], str]:
+    """Look up context for a RAG prompt without blocking the event loop; also returns the query embedding, if computed"""
+    # Loads the collection once, then only reloads when it changes on disk
+    if prompt.search_mode not in SEARCH_MODES:
+        raise HTTPException(status_code=400, detail=f"search_mode must be one of {', '.join(SEARCH_MODES)}")
+    if not prompt.use_context:
+        return None, ""
+    try:
+        rag_system = await get_collection(prompt.collection)
+    except HTTPException as e:
+        if e.status_code < 500:
+            raise
+        # A collection that cannot be loaded still leaves Gemini to answer without context
+        logger.error(f"Answering without context: {e.detail}")
+        return None, ""
+    if rag_system.vectordb is None:
+        return None, ""
+    # Embedding and FAISS search are CPU-bound, so they run on the thread pool
+    token_budget = CONTEXT_TOKEN_BUDGET if prompt.token_budget is None else prompt.token_budget
+    return await run_in_threadpool(
+        rag_system.retrieve, prompt.message, k=3, search_mode=prompt.search_mode, token_budget=token_budget
+    )
+
+async def cached_answer(message: str, context: str,
+                        embedding: Optional[List[float]]) -> Tuple[Optional[str], Optional[List[float]]]:
+    """Look for a cached answer to a similar question over the same context.
+
+    Returns the answer (None on a miss) and the query embedding, computed
+    here if retrieval did not already produce one. Questions asked without
+    context (/ask, or nothing retrieved) skip the cache, so plain chat does
+    not pay for an embedding.
+    """
+    if semantic_cache is None or not context:
+        return None, embedding
+    if embedding is None:
+        embedding = await run_in_threadpool(embeddings.embed_query, message)
+    answer = semantic_cache.get(embedding, context_hash(GEMINI_MODEL, context))
+    if answer is None:
+        metrics.CACHE_MISSES.inc(cache="semantic")
+    else:
+        metrics.CACHE_HITS.inc(cache="semantic")
+    return answer, embedding
+
+def cache_answer(embedding: Optional[List[float]], context: str, answer: str, started: float):
+    if semantic_cache is not None and embedding is not None and context and answer:
+        semantic_cache.put(embedding, context_hash(GEMINI_MODEL, context), answer,
+                           (time.perf_counter() - started) * 1000)
+
+async def generate_answer(message: str, context: str, embedding: Optional[List[float]]) -> Tuple[str, bool]:
+    """Answer from the semantic cache if possible, otherwise ask Gemini; also returns whether it was cached"""
+    answer, embedding = await cached_answer(message, context, embedding)
+    if answer is not None:
+        return answer, True
+    started = time.perf_counter()
+    with metrics.stage("llm"):
+        answer = await gemini.model(GEMINI_MODEL).generate_content(build_prompt(message, context))
+    cache_answer(embedding, context, answer, started)
+    return answer, False
+
+def sse_event(data: dict, event: Optional[str] = None) -> str:
+    """Format one server-sent event"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+async def stream_answer(message: str, context: str, embedding: Optional[List[float]]) -> AsyncIterator[str]:
+    """Stream Gemini's answer as server-sent events: a context event, text events, then done"""
+    yield sse_event({"context_used": bool(context), "context_length": len(context)}, event="context")
+    started = time.perf_counter()
+    ttft_ms = None
+    try:
+        answer, embedding = await cached_answer(message, context, embedding)
+        if answer is not None:
+            yield sse_event({"text": answer})
+            yield sse_event({"cached": True, "total_ms": round((time.perf_counter() - started) * 1000, 1)}, event="done")
+            return
+        
+        parts = []
+        with metrics.stage("llm"):
+            async for text in gemini.model(GEMINI_MODEL).stream_generate_content(build_prompt(message, context)):
+                if ttft_ms is None:
+                    ttft_ms = (time.perf_counter() - started) * 1000
+                    gemini.record("ttft_ms", started)
+                    metrics.STAGE_SECONDS.observe(ttft_ms / 1000, stage="llm_first_token")
+                parts.append(text)
+                yield sse_event({"text": text})
+        cache_answer(embedding, context, "".join(parts), started)
+    except Exception as e:
+        yield sse_event({"error": str(e), "message": "Failed to generate response"}, event="error")
+        return
+    yield sse_event({
+        "cached": False,
+        "ttft_ms": round(ttft_ms, 1) if ttft_ms is not None else None,
+        "total_ms": round((time.perf_counter() - started) * 1000, 1)
+    }, event="done")
+
+def event_stream(events: AsyncIterator[str]) -> StreamingResponse:
+    return StreamingResponse(
+        events, media_type="text/event-stream",
+        # Keep proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @app.post("/ask")
 async def ask_gemini(prompt: Prompt):
     try:
-        model = genai.GenerativeModel("gemini-2.0-flash")
-        response = model.generate_content(prompt.message)
-        return {"response": response.text}
+        response, cached = await generate_answer(prompt.message, "", None)
+        return {"response": response, "cached": cached}
     except Exception as e:
         return {"error": str(e), "message": "Failed to generate response"}
 
+@app.post("/ask/stream")
+async def ask_gemini_stream(prompt: Prompt):
+    """Stream the answer to a question as server-sent events"""
+    return event_stream(stream_answer(prompt.message, "", None))
+
 @app.get("/models")
 async def list_models():
     try:
-        models = genai.list_models()
-        return {"models": [model.name for model in models if 'generateContent' in model.supported_generation_methods]}
+        models = await gemini.list_models()
+        return {"models": [model["name"] for model in models if 'generateContent' in model.get("supportedGenerationMethods", [])]}
     except Exception as e:
         return {"error": str(e)}
 
+def ingest_pdf(job: Job, collection: str, file_path: str, filename: str, file_hash: str) -> dict:
+    """Background job: process an uploaded PDF and persist the new chunks"""
+    try:
+        # Loading the collection brings earlier uploads into memory before appending
+        rag_system = get_collections().get(collection, create=True)
+        
+        # Other processes (ingest.py) may write the same collection: append to their latest save
+        with get_collections().write_lock(collection):
+            rag_system.refresh_vectordb(get_collections().path(collection), wait=True)
+            
+            # Process PDF with RAG system
+            success = rag_system.process_pdf(file_path, progress=job.update, file_hash=file_hash)
+            if not success:
+                raise RuntimeError(f"Failed to process PDF {filename}")
+            
+            # Persist only the newly added chunks
+            rag_system.save_delta(get_collections().path(collection))
+        get_collections().enforce_budget()
+        return {
+            "message": f"PDF {filename} processed successfully",
+            "collection": collection,
+            "ingest_stats": rag_system.last_ingest_stats
+        }
+    finally:
+        inflight_uploads.pop((collection, file_hash), None)
+
+def save_upload(file: UploadFile, upload_dir: str) -> Tuple[str, str]:
+    """Copy an upload to a temporary file in upload_dir, hashing it on the way; returns (path, SHA-256).
+
+    Starlette has already spooled the request body, so this is a second copy:
+    run it on the thread pool. The temporary file is removed if the copy fails.
+    """
+    temp_path = os.path.join(upload_dir, f".{uuid.uuid4().hex}.part")
+    sha256 = hashlib.sha256()
+    try:
+        file.file.seek(0)
+        with open(temp_path, "wb") as buffer:
+            while True:
+                data = file.file.read(UPLOAD_CHUNK_SIZE)
+                if not data:
+                    break
+                sha256.update(data)
+                buffer.write(data)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return temp_path, sha256.hexdigest()
+
+def upload_path(upload_dir: str, filename: str, file_hash: str) -> str:
+    """Where an upload waits for ingestion: its base name behind a hash prefix, so a client-supplied
+    name cannot point outside upload_dir and different files with the same name never overwrite each other"""
+    name = os.path.basename(filename.replace("\\", "/"))
+    return os.path.join(upload_dir, f"{file_hash[:16]}-{name}")
+
+def pending_job(collection: str, file_hash: str) -> Optional[Job]:
+    """The queued or running job already ingesting this content, if any"""
+    job = inflight_uploads.get((collection, file_hash))
+    if job is not None and job.status not in ("queued", "running"):
+        return None
+    return job
+
 @app.post("/upload-pdf")
-async def upload_pdf(file: UploadFile = File(...)):
-    """Upload and process PDF for RAG"""
+async def upload_pdf(file: UploadFile = File(...), collection: str = DEFAULT_COLLECTION):
+    """Upload a PDF into a collection and queue it for RAG processing, skipping files already ingested"""
     if not file.filename.endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Only PDF files are allowed")
+    rag_system = await get_collection(collection, create=True)
     
     try:
-        # Save uploaded file
-        file_path = os.path.join(UPLOAD_DIR, file.filename)
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        upload_dir = os.path.join(UPLOAD_DIR, collection)
+        os.makedirs(upload_dir, exist_ok=True)
+        temp_path, file_hash = await run_in_threadpool(save_upload, file, upload_dir)
+        
+        # Identical content already indexed or on its way: skip parsing and embedding
+        existing_job = pending_job(collection, file_hash)
+        if rag_system.is_ingested(file_hash) or existing_job is not None:
+            os.remove(temp_path)
+            return {
+                "message": f"PDF {file.filename} was already uploaded",
+                "success": True,
+                "duplicate": True,
+                "job_id": existing_job.id if existing_job else None,
+                "status": existing_job.status if existing_job else "completed"
+            }
         
-        # Process PDF with RAG system
-        success = rag_system.process_pdf(file_path)
+        file_path = upload_path(upload_dir, file.filename, file_hash)
+        os.replace(temp_path, file_path)
         
-        if success:
-            # Save vector database
-            rag_system.save_vectordb(VECTORDB_DIR)
-            return {"message": f"PDF {file.filename} processed successfully", "success": True}
-        else:
-            raise HTTPException(status_code=500, detail="Failed to process PDF")
+        # Parsing and embedding run on the job worker, not the event loop
+        filename = file.filename
+        job = job_queue.submit(
+            filename, lambda job: ingest_pdf(job, collection, file_path, filename, file_hash)
+        )
+        inflight_uploads[(collection, file_hash)] = job
+        return {
+            "message": f"PDF {file.filename} queued for processing",
+            "success": True,
+            "duplicate": False,
+            "job_id": job.id,
+            "status": job.status
+        }
             
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/ask-with-context")
-async def ask_with_context(prompt: RAGPrompt):
-    """Ask question with RAG context"""
-    try:
-        # Try to load existing vector database
-        if os.path.exists(VECTORDB_DIR):
-            try:
-                rag_system.load_vectordb(VECTORDB_DIR)
-            except:
-                pass
-        
-        context = ""
-        if prompt.use_context and rag_system.vectordb is not None:
-            context = rag_system.get_context(prompt.message, k=3)
+def ingest_pdfs(job: Job, collection: str, files: List[Tuple[str, str]]) -> dict:
+    """Background job: bulk-process uploaded PDFs (path, hash) and persist them in one save"""
+    try:
+        rag_system = get_collections().get(collection, create=True)
+        paths = [path for path, _ in files]
+        with get_collections().write_lock(collection):
+            rag_system.refresh_vectordb(get_collections().path(collection), wait=True)
+            outcome = rag_system.process_pdfs(
+                paths, progress=job.update, file_hashes=dict(files),
+                workers=int(os.getenv("INGEST_PROCESSES", "0")) or None
+            )
+            if outcome["ingested"]:
+                rag_system.save_delta(get_collections().path(collection))
+        if outcome["ingested"]:
+            get_collections().enforce_budget()
+        return {
+            "message": f"Processed {len(outcome['ingested'])} of {len(files)} PDFs",
+            "collection": collection,
+            "failed": {os.path.basename(path): error for path, error in outcome["failed"].items()},
+            "ingest_stats": outcome["stats"]
+        }
+    finally:
+        for _, file_hash in files:
+            inflight_uploads.pop((collection, file_hash), None)
+
+@app.post("/upload-pdfs")
+async def upload_pdfs(files: List[UploadFile] = File(...), collection: str = DEFAULT_COLLECTION):
+    """Upload many PDFs into a collection as one bulk job; duplicates are skipped"""
+    not_pdf = [file.filename for file in files if not file.filename.endswith('.pdf')]
+    if not_pdf:
+        raise HTTPException(status_code=400, detail=f"Only PDF files are allowed: {', '.join(not_pdf)}")
+    rag_system = await get_collection(collection, create=True)
+    
+    try:
+        upload_dir = os.path.join(UPLOAD_DIR, collection)
+        os.makedirs(upload_dir, exist_ok=True)
+        accepted, duplicates, hashes = [], [], set()
+        for file in files:
+            temp_path, file_hash = await run_in_threadpool(save_upload, file, upload_dir)
+            if rag_system.is_ingested(file_hash) or pending_job(collection, file_hash) or file_hash in hashes:
+                os.remove(temp_path)
+                duplicates.append(file.filename)
+                continue
+            file_path = upload_path(upload_dir, file.filename, file_hash)
+            os.replace(temp_path, file_path)
+            accepted.append((file_path, file_hash))
+            hashes.add(file_hash)
         
-        # Create enhanced prompt with context
-        if context:
-            enhanced_prompt = f"""
-Context from documents:
-{context}
+        if not accepted:
+            return {
+                "message": "All PDFs were already uploaded",
+                "success": True,
+                "duplicates": duplicates,
+                "job_id": None,
+                "status": "completed"
+            }
+        job = job_queue.submit(
+            f"{len(accepted)} PDFs", lambda job: ingest_pdfs(job, collection, accepted)
+        )
+        job.files_total = len(accepted)
+        for _, file_hash in accepted:
+            inflight_uploads[(collection, file_hash)] = job
+        return {
+            "message": f"{len(accepted)} PDFs queued for processing",
+            "success": True,
+            "duplicates": duplicates,
+            "job_id": job.id,
+            "status": job.status
+        }
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-Question: {prompt.message}
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Report the progress of a background ingestion job"""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
 
-Please answer the question based on the provided context. If the context doesn't contain relevant information, you can provide a general answer but mention that it's not based on the uploaded documents.
-"""
-        else:
-            enhanced_prompt = prompt.message
-        
-        # Generate response with Gemini
-        model = genai.GenerativeModel("gemini-2.0-flash")
-        response = model.generate_content(enhanced_prompt)
+@app.post("/ask-with-context")
+async def ask_with_context(prompt: RAGPrompt):
+    """Ask question with RAG context from a collection"""
+    embedding, context = await retrieve_context(prompt)
+    try:
+        # Generate response with Gemini, unless a similar question was already answered
+        response, cached = await generate_answer(prompt.message, context, embedding)
         
         return {
-            "response": response.text,
+            "response": response,
+            "cached": cached,
             "context_used": bool(context),
             "context_length": len(context) if context else 0
         }
@@ -125,30 +578,139 @@ Please answer the question based on the provided context. If the context doesn't
     except Exception as e:
         return {"error": str(e), "message": "Failed to generate response"}
 
+@app.post("/ask-with-context/stream")
+async def ask_with_context_stream(prompt: RAGPrompt):
+    """Stream an answer with RAG context as server-sent events"""
+    embedding, context = await retrieve_context(prompt)
+    return event_stream(stream_answer(prompt.message, context, embedding))
+
+@app.post("/search-batch")
+async def search_batch(request: BatchSearch):
+    """Retrieve the top-k chunks for many queries in one call"""
+    rag_system = await get_collection(request.collection)
+    if rag_system.vectordb is None:
+        raise HTTPException(status_code=400, detail="No vector database available")
+    
+    try:
+        # Embedding and FAISS search are CPU-bound, so they run on the thread pool
+        results = await run_in_threadpool(rag_system.similarity_search_batch, request.queries, k=request.k)
+        return {
+            "results": [
+                [
+                    {"content": doc.page_content, "metadata": doc.metadata, "score": score}
+                    for doc, score in hits
+                ]
+                for hits in results
+            ]
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/vectordb-status")
-async def vectordb_status():
-    """Check if vector database is available"""
-    has_vectordb = os.path.exists(VECTORDB_DIR) and rag_system.vectordb is not None
+async def vectordb_status(collection: str = DEFAULT_COLLECTION):
+    """Check if a collection's vector database is available"""
+    rag_system = await get_collection(collection)
+    has_vectordb = rag_system.vectordb is not None
     return {
+        "collection": collection,
         "has_vectordb": has_vectordb,
-        "vectordb_path": VECTORDB_DIR if has_vectordb else None
+        "vectordb_path": get_collections().path(collection) if has_vectordb else None,
+        "index_type": rag_system.index_type,
+        "index_in_use": rag_system.describe_index() if has_vectordb else None,
+        "storage": rag_system.storage,
+        "storage_in_use": rag_system.describe_storage() if has_vectordb else None,
+        "memory_bytes": rag_system.memory_usage()
     }
 
+@app.get("/stats")
+async def stats(collection: str = DEFAULT_COLLECTION):
+    """Report cache hit/miss counters"""
+    rag_system = await get_collection(collection)
+    return {
+        "collection": collection,
+        "query_cache": rag_system.query_cache.stats(),
+        "embedding_cache": {
+            "hits": embedding_cache.hits,
+            "misses": embedding_cache.misses
+        },
+        "embeddings": embeddings.stats(),
+        "reranker": reranker.stats() if reranker else None,
+        # headers_ms is the per-request overhead before Gemini starts answering
+        "gemini_latency_ms": gemini.stats(),
+        # saved_ms adds up the generation time of the answers served from the cache
+        "semantic_cache": semantic_cache.stats() if semantic_cache else None
+    }
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Per-stage latency histograms and chunk, cache and error counters in the Prometheus text format.
+
+    Compare rag_stage_seconds for stage="retrieve" (embedding, search, rerank and
+    packing together) with stage="llm" to see which one drives tail latency.
+    """
+    snapshots = metrics.load_snapshots(METRICS_DIR, exclude=metrics_snapshot) if METRICS_DIR else []
+    return PlainTextResponse(metrics.REGISTRY.render(snapshots), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is up and serving, warm or not"""
+    return {"status": "alive"}
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: 200 once the RAG stack, embedding model and default collection are loaded, else 503"""
+    checks = {
+        "rag_stack": collections is not None,
+        "embedding_model": embeddings.loaded,
+        "default_collection": collections is not None and collections.is_loaded(DEFAULT_COLLECTION),
+    }
+    ready = all(checks.values())
+    return JSONResponse(status_code=200 if ready else 503, content={
+        "status": "warm" if ready else "warming",
+        "startup_mode": STARTUP_MODE,
+        "checks": checks,
+        "warm_up_s": warm_up_timings,
+        "error": warm_up_error
+    })
+
+@app.get("/collections")
+async def list_collections():
+    """List collections and whether each is loaded in memory"""
+    return {"collections": await run_in_threadpool(lambda: get_collections().list())}
+
+@app.post("/collections")
+async def create_collection(request: CollectionRequest):
+    """Create an empty collection"""
+    try:
+        await run_in_threadpool(lambda: get_collections().create(request.name))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"message": f"Collection {request.name} created", "name": request.name}
+
+@app.delete("/collections/{name}")
+async def drop_collection(name: str):
+    """Delete a collection, its index and its uploaded files"""
+    try:
+        # Waits on the collection's write lock, held by any running ingest job
+        await run_in_threadpool(lambda: get_collections().drop(name))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Collection {name} not found")
+    upload_dir = os.path.join(UPLOAD_DIR, name)
+    if os.path.exists(upload_dir):
+        shutil.rmtree(upload_dir)
+    return {"message": f"Collection {name} deleted"}
+
 @app.delete("/clear-vectordb")
-async def clear_vectordb():
-    """Clear the vector database"""
+async def clear_vectordb(collection: str = DEFAULT_COLLECTION):
+    """Clear one collection's vector database (the default collection unless given)"""
+    await get_collection(collection)
     try:
-        if os.path.exists(VECTORDB_DIR):
-            shutil.rmtree(VECTORDB_DIR)
-        if os.path.exists(UPLOAD_DIR):
-            shutil.rmtree(UPLOAD_DIR)
-        
-        # Recreate directories
-        os.makedirs(UPLOAD_DIR, exist_ok=True)
-        os.makedirs(VECTORDB_DIR, exist_ok=True)
-        
-        # Reset RAG system
-        rag_system.vectordb = None
+        await run_in_threadpool(get_collections().clear, collection)
+        upload_dir = os.path.join(UPLOAD_DIR, collection)
+        if os.path.exists(upload_dir):
+            shutil.rmtree(upload_dir)
         
         return {"message": "Vector database cleared successfully"}
     except Exception as e:
@@ -0,0 +1,258 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Histogram bucket upper bounds in seconds, from cache hits to minute-long LLM calls and saves
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Counter:
+    """A count per combination of label values that only goes up"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def values(self) -> list:
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+
+class Histogram(Counter):
+    """Observations per combination of label values, counted into fixed buckets"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = buckets
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        # Per-bucket (not cumulative) counts with a last +Inf bucket, then sum and count
+        bucket = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][bucket] += 1
+            state[1] += value
+            state[2] += 1
+
+    def values(self) -> list:
+        with self._lock:
+            return [[list(key), [list(counts), total, count]] for key, (counts, total, count) in self._values.items()]
+
+
+class Registry:
+    """The metrics of one process, rendered in the Prometheus text format.
+
+    Under serve.py every worker keeps its own registry and saves a snapshot
+    of it to a shared directory every few seconds (see share_snapshots);
+    /metrics merges them, so a scrape covers all workers whichever one
+    answers it.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, Counter] = {}
+
+    def counter(self, name: str, documentation: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labels))
+
+    def histogram(self, name: str, documentation: str, labels: Tuple[str, ...] = ()) -> Histogram:
+        return self._register(Histogram(name, documentation, labels))
+
+    def _register(self, metric: Counter):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def snapshot(self) -> dict:
+        """Current values of every metric, as JSON-serialisable data"""
+        return {name: metric.values() for name, metric in self._metrics.items()}
+
+    def render(self, snapshots: Iterable[dict] = ()) -> str:
+        """This process's metrics plus those in snapshots (from other processes), summed"""
+        merged = {name: {} for name in self._metrics}
+        for snapshot in [self.snapshot(), *snapshots]:
+            for name, values in snapshot.items():
+                if name not in merged:
+                    continue
+                for key, value in values:
+                    merged[name][tuple(key)] = _add(merged[name].get(tuple(key)), value)
+
+        lines = []
+        for name, metric in self._metrics.items():
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            for key, value in sorted(merged[name].items()):
+                labels = list(zip(metric.labels, key))
+                if metric.kind == "counter":
+                    lines.append(f"{name}{_labels(labels)} {_number(value)}")
+                    continue
+                counts, total, count = value
+                cumulative = 0
+                for bound, bucket_count in zip([*metric.buckets, "+Inf"], counts):
+                    cumulative += bucket_count
+                    le = bound if bound == "+Inf" else _number(bound)
+                    lines.append(f"{name}_bucket{_labels(labels + [('le', le)])} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(total)}")
+                lines.append(f"{name}_count{_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _add(current, value):
+    if current is None:
+        return value
+    if isinstance(value, list):
+        counts, total, count = value
+        return [[a + b for a, b in zip(current[0], counts)], current[1] + total, current[2] + count]
+    return current + value
+
+
+def _labels(pairs: List[Tuple[str, str]]) -> str:
+    if not pairs:
+        return ""
+    escaped = (
+        name + '="' + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for name, value in pairs
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+REGISTRY = Registry()
+STAGE_SECONDS = REGISTRY.histogram(
+    "rag_stage_seconds", "Time spent in each RAG pipeline stage", ("stage",)
+)
+STAGE_ERRORS = REGISTRY.counter(
+    "rag_stage_errors_total", "Pipeline stages that raised an error", ("stage",)
+)
+CHUNKS_INGESTED = REGISTRY.counter(
+    "rag_chunks_ingested_total", "Chunks embedded and added to a collection"
+)
+CHUNKS_RETRIEVED = REGISTRY.counter(
+    "rag_chunks_retrieved_total", "Chunks returned by searches, before context packing"
+)
+CACHE_HITS = REGISTRY.counter(
+    "rag_cache_hits_total", "Lookups answered by a cache (embedding, query or semantic)", ("cache",)
+)
+CACHE_MISSES = REGISTRY.counter(
+    "rag_cache_misses_total", "Lookups a cache could not answer (embedding, query or semantic)", ("cache",)
+)
+
+
+@contextmanager
+def stage(name: str):
+    """Time the block into rag_stage_seconds; errors raised in it count towards rag_stage_errors_total"""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage=name)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage=name)
+
+
+def timed(name: str) -> Callable:
+    """Decorator form of stage, for functions that are a stage as a whole"""
+    def decorator(function: Callable) -> Callable:
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def timed_iter(items: Iterable, name: str) -> Iterator:
+    """Pass items through, recording the total time spent producing them as one observation of stage name"""
+    items = iter(items)
+    elapsed = 0.0
+    try:
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(items)
+            except StopIteration:
+                elapsed += time.perf_counter() - started
+                break
+            except Exception:
+                STAGE_ERRORS.inc(stage=name)
+                raise
+            elapsed += time.perf_counter() - started
+            yield item
+    finally:
+        STAGE_SECONDS.observe(elapsed, stage=name)
+
+
+def share_snapshots(directory: str, interval: float = 5) -> str:
+    """Save this process's snapshot to directory every interval seconds, for the other workers' /metrics.
+
+    Returns the snapshot file. Files of workers that exited are kept, so
+    their counts still add to the totals.
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{os.getpid()}.json")
+
+    def save_periodically():
+        while True:
+            save_snapshot(path)
+            time.sleep(interval)
+
+    threading.Thread(target=save_periodically, name="metrics-snapshots", daemon=True).start()
+    return path
+
+
+def save_snapshot(path: str):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(REGISTRY.snapshot(), f)
+    # Atomic rename so readers never see a partial snapshot
+    os.replace(tmp_path, path)
+
+
+def load_snapshots(directory: str, exclude: Optional[str] = None) -> List[dict]:
+    """Snapshots saved by other processes in directory (all but exclude)"""
+    snapshots = []
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    for name in names:
+        path = os.path.join(directory, name)
+        if not name.endswith(".json") or path == exclude:
+            continue
+        try:
+            with open(path) as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            # Removed or replaced while listing
+            continue
+    return snapshots
@@ -0,0 +1,83 @@
+"""Show where a backend worker's startup seconds go.
+
+Usage:
+    python profile_startup.py
+    python profile_startup.py --top 30
+    python profile_startup.py --module rag_system --no-warm-up
+
+Imports the module in a fresh interpreter with -X importtime and prints
+the total import time, then the packages that spent the most time in
+their own module code. For main, it then runs the warm-up (RAG stack,
+embedding model, default collection) in another fresh process and prints
+the time spent in each stage.
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+# "import time:      1234 |       5678 |     package.module"
+IMPORT_TIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+WARM_UP_SCRIPT = """
+import json, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter() - started
+main.warm_up()
+print(json.dumps({"import_s": round(imported, 3), **main.warm_up_timings, "error": main.warm_up_error}))
+"""
+
+
+def run_python(args: list) -> subprocess.CompletedProcess:
+    # Lazy startup, so importing main does not start warming up on its own
+    env = dict(os.environ, STARTUP_MODE="lazy")
+    return subprocess.run([sys.executable, *args], capture_output=True, text=True,
+                          env=env, cwd=os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_profile(module: str) -> dict:
+    """Total import time of module and self time per top-level package, in seconds"""
+    result = run_python(["-X", "importtime", "-c", f"import {module}"])
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    total = 0
+    packages = defaultdict(int)
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        packages[name.split(".")[0]] += int(self_us)
+        if name == module and len(indent) == 1:
+            total = int(cumulative_us)
+    return {
+        "total_s": total / 1e6,
+        "packages": {name: us / 1e6 for name, us in sorted(packages.items(), key=lambda item: -item[1])},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--top", type=int, default=15, help="packages to list")
+    parser.add_argument("--no-warm-up", action="store_true", help="only profile the import")
+    args = parser.parse_args()
+
+    profile = import_profile(args.module)
+    print(json.dumps({"module": args.module, "import_s": round(profile["total_s"], 3)}))
+    for name, seconds in list(profile["packages"].items())[:args.top]:
+        print(json.dumps({"package": name, "self_s": round(seconds, 3)}))
+
+    if args.module == "main" and not args.no_warm_up:
+        result = run_python(["-c", WARM_UP_SCRIPT])
+        if result.returncode != 0:
+            raise RuntimeError(f"Warm-up failed:\n{result.stderr[-2000:]}")
+        print(json.dumps({"warm_up": json.loads(result.stdout.strip().splitlines()[-1])}))
+
+
+if __name__ == "__main__":
+    main()
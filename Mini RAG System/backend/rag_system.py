@@ -1,29 +1,132 @@
 from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
+import faiss
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.document_loaders import PyPDFLoader
-from langchain.schema import Document
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from embedding_cache import EmbeddingCache
+from query_cache import QueryCache
+from chunk_store import ChunkStore, ChunkStoreFAISS, RowIds
+from bm25_index import BM25Index, SEARCH_MODES
+from reranker import CrossEncoderReranker
+from context_packer import ContextPacker, token_counter
+from chunk_loader import iter_json_records, record_to_document
+from embedding_backends import EMBEDDING_MODEL, make_embeddings
+import vector_index
+import metrics
+import json
 import os
 import pickle
-from typing import List, Optional
+import shutil
+import threading
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from itertools import islice
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
 import logging
+import numpy as np
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# File written next to the index by save_vectordb; its content changes on every save
+VERSION_FILE = "version"
+INDEX_FILE = "index.faiss"
+# Docstore pickle written by older versions; still readable, replaced on the next save
+LEGACY_DOCSTORE_FILE = "index.pkl"
+# Appended uploads are persisted as small segments under this directory
+SEGMENTS_DIR = "segments"
+# Once this many segments pile up, save_delta rewrites the full index instead
+MAX_SEGMENTS = 16
+# SHA-256 -> filename of every PDF already in the index, saved next to it
+INGESTED_FILE = "ingested.json"
+# Characters per chunk, and characters shared by neighbouring chunks
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 100
+
+def make_text_splitter() -> RecursiveCharacterTextSplitter:
+    """Chunking used for every document, in this process or an ingest worker"""
+    return RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP,
+        length_function=len,
+        # Character offset within the page, used to merge overlapping chunks in get_context
+        add_start_index=True
+    )
+
+def load_and_chunk(pdf_path: str) -> Tuple[int, List[Document], float, float]:
+    """Parse and chunk one PDF; runs in worker processes for bulk ingestion.
+    
+    Returns (pages, chunks, load seconds, split seconds); the timings go
+    back to the parent, as metrics recorded in a worker are lost.
+    """
+    started = time.perf_counter()
+    pages = PyPDFLoader(pdf_path).load()
+    loaded = time.perf_counter()
+    chunks = make_text_splitter().split_documents(pages)
+    return len(pages), chunks, loaded - started, time.perf_counter() - loaded
+
 class RAGSystem:
-    def __init__(self):
-        # Use HuggingFace embeddings (free alternative to OpenAI)
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/all-MiniLM-L6-v2"
+    def __init__(self, embedding_cache_path: str = "embedding_cache.db",
+                 embed_batch_size: int = 64, embed_workers: int = 1,
+                 query_cache_size: int = 256, query_cache_ttl: float = 300,
+                 index_type: str = "flat", index_params: Optional[dict] = None,
+                 storage: str = "float32", mmap: bool = False,
+                 embeddings: Optional[Embeddings] = None,
+                 embedding_cache: Optional[EmbeddingCache] = None,
+                 reranker: Optional[CrossEncoderReranker] = None, rerank_candidates: int = 50,
+                 pack_candidates: int = 20):
+        # Use HuggingFace embeddings (free alternative to OpenAI), loaded on first use; pass
+        # embeddings and embedding_cache to share one model and cache between instances
+        self.embeddings = embeddings or make_embeddings()
+        # Chunk vectors survive /clear-vectordb so re-uploads skip the model
+        self.embedding_cache = embedding_cache or EmbeddingCache(
+            embedding_cache_path, getattr(self.embeddings, "model_id", EMBEDDING_MODEL)
         )
+        # Ingestion batching; tune batch size for CPU-only nodes using last_ingest_stats. One
+        # batch already runs on every core (PyTorch / ONNX Runtime intra-op threads), so more
+        # workers only pay off when the model is held to fewer threads (EMBED_THREADS)
+        self.embed_batch_size = embed_batch_size
+        self.embed_workers = max(embed_workers, 1)
+        self.last_ingest_stats = None
+        # Repeated questions skip re-embedding and re-searching; keyed on the index generation
+        self.query_cache = QueryCache(query_cache_size, query_cache_ttl)
+        self._index_generation = 0
+        # Optional second stage: get_context retrieves rerank_candidates chunks and keeps the reranker's top k
+        self.reranker = reranker
+        self.rerank_candidates = rerank_candidates
+        # With a token budget, get_context packs up to pack_candidates chunks instead of joining the top k
+        self.pack_candidates = pack_candidates
+        self.context_packer = ContextPacker(token_counter(self.embeddings))
+        # FAISS index type ("flat", "ivf_flat", "ivf_pq" or "hnsw") and its tuning parameters
+        if index_type not in vector_index.INDEX_TYPES:
+            raise ValueError(f"Unknown index type {index_type!r}")
+        self.index_type = index_type
+        self.index_params = vector_index.index_params(index_params)
+        # Vector precision in memory and on disk ("float32", "float16" or "int8")
+        vector_index.check_storage(index_type, storage)
+        self.storage = storage
+        # Map saved indexes read-only so worker processes share one copy in the page cache;
+        # rows added later go to a small in-memory index searched alongside it (see _append)
+        self.mmap = mmap
         self.vectordb = None
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=500, 
-            chunk_overlap=100,
-            length_function=len
-        )
+        # Keyword index over the same rows as the vector index, for hybrid search
+        self.bm25 = None
+        # Version stamp of the index currently held in self.vectordb
+        self.index_version = None
+        self._reload_lock = threading.Lock()
+        self._reload_thread = None
+        # FAISS is not safe to search while vectors are being added from the ingest worker
+        self._index_lock = threading.RLock()
+        # Content hashes of ingested PDFs, used to skip re-uploads
+        self.ingested_files = {}
+        # Number of vectors in self.vectordb that are already persisted
+        self._saved_count = 0
+        # Set when the index type changed in memory (training), so only a full save persists it
+        self._full_save_needed = False
+        self.text_splitter = make_text_splitter()
         
     def load_pdf(self, pdf_path: str) -> List[Document]:
         """Load PDF document and return pages"""
@@ -36,6 +139,15 @@ class RAGSystem:
             logger.error(f"Error loading PDF: {str(e)}")
             raise
     
+    def iter_pdf_pages(self, pdf_path: str) -> Iterator[Document]:
+        """Yield PDF pages one at a time instead of loading the whole document"""
+        try:
+            loader = PyPDFLoader(pdf_path)
+            yield from metrics.timed_iter(loader.lazy_load(), "pdf_load")
+        except Exception as e:
+            logger.error(f"Error loading PDF: {str(e)}")
+            raise
+    
     def create_chunks(self, documents: List[Document]) -> List[Document]:
         """Split documents into chunks"""
         try:
@@ -46,76 +158,834 @@ class RAGSystem:
             logger.error(f"Error creating chunks: {str(e)}")
             raise
     
+    def iter_chunks(self, pages: Iterable[Document]) -> Iterator[Document]:
+        """Split pages into chunks as they arrive"""
+        elapsed = 0.0
+        try:
+            for page in pages:
+                started = time.perf_counter()
+                chunks = self.text_splitter.split_documents([page])
+                elapsed += time.perf_counter() - started
+                yield from chunks
+        finally:
+            # One observation per document, like pdf_load
+            metrics.STAGE_SECONDS.observe(elapsed, stage="split")
+    
+    def embed_texts(self, texts: List[str]) -> List[List[float]]:
+        """Embed chunk texts, reusing cached vectors and sending only misses to the model"""
+        vectors = self.embedding_cache.get_many(texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        metrics.CACHE_HITS.inc(len(texts) - len(missing), cache="embedding")
+        metrics.CACHE_MISSES.inc(len(missing), cache="embedding")
+        if missing:
+            with metrics.stage("embed"):
+                new_vectors = self.embeddings.embed_documents([texts[i] for i in missing])
+            self.embedding_cache.put_many([texts[i] for i in missing], new_vectors)
+            for i, vector in zip(missing, new_vectors):
+                vectors[i] = vector
+        logger.info(f"Embedded {len(texts)} chunks ({len(texts) - len(missing)} from cache)")
+        return vectors
+    
+    def embed_in_batches(self, texts: List[str]) -> Iterator[Tuple[int, List[List[float]]]]:
+        """Embed texts in batches on a worker pool, yielding (start, vectors) as each batch completes"""
+        batches = [
+            (start, texts[start:start + self.embed_batch_size])
+            for start in range(0, len(texts), self.embed_batch_size)
+        ]
+        if len(batches) <= 1 or self.embed_workers <= 1:
+            for start, batch in batches:
+                yield start, self.embed_texts(batch)
+            return
+        
+        # The model releases the GIL inside its forward pass, so threads run batches in parallel;
+        # workers times the model's own threads should not exceed the cores
+        with ThreadPoolExecutor(max_workers=min(self.embed_workers, len(batches))) as pool:
+            futures = {pool.submit(self.embed_texts, batch): start for start, batch in batches}
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+    
     def create_vectordb(self, chunks: List[Document]) -> FAISS:
         """Create vector database from chunks"""
         try:
-            self.vectordb = FAISS.from_documents(chunks, self.embeddings)
+            self.vectordb = None
+            self.add_to_vectordb(chunks)
             logger.info("Vector database created successfully")
             return self.vectordb
         except Exception as e:
             logger.error(f"Error creating vector database: {str(e)}")
             raise
     
+    def add_to_vectordb(self, chunks: Iterable[Document],
+                        progress: Optional[Callable[[str, int], None]] = None) -> FAISS:
+        """Embed only the new chunks and append them to the live vector database.
+        
+        chunks may be a lazy iterator; it is consumed in windows of one batch
+        per worker, so memory stays bounded however long the document is.
+        Vectors are added to the index batch by batch as the embedding workers
+        finish, and throughput is recorded in last_ingest_stats. progress, if
+        given, is called with ("chunks_embedded", count) after each batch.
+        If anything fails part way (a page that cannot be parsed, the model),
+        the chunks already added are rolled back, so nothing of the document
+        is left in the index.
+        """
+        first_row = self.vectordb.index.ntotal if self.vectordb is not None else 0
+        try:
+            started = time.perf_counter()
+            window_size = self.embed_batch_size * self.embed_workers
+            chunks = iter(chunks)
+            embedded = 0
+            
+            while True:
+                window = list(islice(chunks, window_size))
+                if not window:
+                    break
+                texts = [chunk.page_content for chunk in window]
+                metadatas = [chunk.metadata for chunk in window]
+                
+                for start, embeddings in self.embed_in_batches(texts):
+                    end = start + len(embeddings)
+                    self._append(texts[start:end], embeddings, metadatas[start:end])
+                    embedded += len(embeddings)
+                    if progress:
+                        progress("chunks_embedded", embedded)
+            
+            elapsed = time.perf_counter() - started
+            self.last_ingest_stats = {
+                "chunks": embedded,
+                "seconds": round(elapsed, 3),
+                "chunks_per_second": round(embedded / elapsed, 1) if elapsed > 0 else None,
+                "batch_size": self.embed_batch_size,
+                "workers": self.embed_workers,
+            }
+            logger.info(
+                f"Added {embedded} chunks to vector database "
+                f"({self.last_ingest_stats['chunks_per_second']} chunks/s)"
+            )
+            return self.vectordb
+        except Exception as e:
+            logger.error(f"Error adding to vector database: {str(e)}")
+            self._rollback(first_row)
+            raise
+    
+    def _append(self, texts: List[str], embeddings: List[List[float]], metadatas: List[dict]):
+        """Add embedded chunks to the index, chunk store and BM25 index in one locked step"""
+        with self._index_lock, metrics.stage("index_add"):
+            if self.vectordb is None:
+                self.vectordb = self._new_vectordb(len(embeddings[0]))
+                self.bm25 = BM25Index()
+            index = self.vectordb.index
+            first_row = index.ntotal
+            if vector_index.is_mapped(index):
+                # The mapped shard is read-only: new rows go to the in-memory tail shard.
+                # Searches hold the index lock, so none sees the tail standing in for the view.
+                self.vectordb.index = vector_index.tail_index(index)
+            try:
+                # Docstore ids are row numbers in the chunk store
+                self.vectordb.add_embeddings(
+                    list(zip(texts, embeddings)), metadatas=metadatas,
+                    ids=self.vectordb.docstore.next_ids(len(embeddings))
+                )
+            finally:
+                if self.vectordb.index is not index:
+                    self.vectordb.index = index
+                    index.syncWithSubIndexes()
+            self.bm25.add(first_row, texts)
+            self._index_changed()
+        metrics.CHUNKS_INGESTED.inc(len(texts))
+        self._maybe_train_index(self.vectordb)
+    
+    def _rollback(self, first_row: int):
+        """Drop the rows added from first_row on (none of them saved yet) from the index, chunk store and BM25 index"""
+        with self._index_lock:
+            if self.vectordb is None or self.vectordb.index.ntotal <= first_row:
+                return
+            dropped = self.vectordb.index.ntotal - first_row
+            if first_row == 0:
+                self.vectordb = None
+                self.bm25 = None
+            else:
+                # Each part is only cut back as far as first_row, whichever step of _append failed
+                self.vectordb.index = vector_index.truncate(self.vectordb.index, first_row, self.index_params)
+                self.vectordb.docstore.truncate(first_row)
+                self.vectordb.index_to_docstore_id.truncate(first_row)
+                self.bm25.truncate(first_row)
+            self._index_changed()
+        logger.warning(f"Rolled back {dropped} chunks of a failed ingest")
+    
+    def _unmap_index(self):
+        """Replace a mapped view with a private, writable copy of its rows; call with _index_lock held"""
+        view = self.vectordb.index
+        if vector_index.is_mapped(view):
+            index = vector_index.read_index(os.path.join(self.vectordb.docstore.path, INDEX_FILE))
+            vector_index.apply_search_params(index, self.index_params)
+            tail = vector_index.tail_index(view)
+            index.add(tail.reconstruct_n(0, tail.ntotal))
+            self.vectordb.index = index
+    
+    def _new_vectordb(self, dimension: int) -> FAISS:
+        """Create an empty vector database using the configured index type"""
+        # IVF and int8 indexes need training data, so they start out as an exact flat index
+        if vector_index.needs_training(self.index_type, self.storage):
+            index = vector_index.create_index("flat", dimension, self.index_params)
+        else:
+            index = vector_index.create_index(self.index_type, dimension, self.index_params, self.storage)
+        return ChunkStoreFAISS(self.embeddings, index, ChunkStore(), RowIds())
+    
+    def _maybe_train_index(self, vectordb: FAISS):
+        """Switch a flat index to the configured IVF type or int8 storage once it holds enough vectors to train on.
+        
+        Training runs outside the index lock, so searches keep using the flat
+        index until the trained one is swapped in. Only the ingest worker adds
+        vectors, so none can arrive in between.
+        """
+        if not vector_index.needs_training(self.index_type, self.storage):
+            return
+        index = vectordb.index
+        # Only the exact float32 index that stands in until training is replaced (mapped or not)
+        if type(vector_index.base_index(index)) is not faiss.IndexFlatL2:
+            return
+        if index.ntotal < vector_index.train_size(self.index_type, self.index_params, self.storage):
+            return
+        
+        vectors = vector_index.reconstruct_n(index, 0, index.ntotal)
+        trained = vector_index.build_trained_index(self.index_type, vectors, self.index_params, self.storage)
+        with self._index_lock:
+            # Rows keep their positions, so index_to_docstore_id stays valid
+            vectordb.index = trained
+            self._index_changed()
+            # Segments only hold vectors; without a full save every load would train again
+            self._full_save_needed = True
+        logger.info(f"Trained {self.index_type} ({self.storage}) index on {len(vectors)} vectors")
+    
+    def describe_index(self) -> Optional[str]:
+        """Index type currently serving searches (IVF types report "flat" until trained)"""
+        vectordb = self.vectordb
+        if vectordb is None:
+            return None
+        return vector_index.describe_index(vectordb.index)
+    
+    def describe_storage(self) -> Optional[str]:
+        """Vector storage currently in use (int8 reports "float32" until trained)"""
+        vectordb = self.vectordb
+        if vectordb is None:
+            return None
+        return vector_index.describe_storage(vectordb.index)
+    
+    def has_unsaved_changes(self) -> bool:
+        """True when the in-memory index holds chunks that are not on disk yet"""
+        vectordb = self.vectordb
+        return vectordb is not None and (vectordb.index.ntotal != self._saved_count or self._full_save_needed)
+    
+    def memory_usage(self) -> int:
+        """Rough resident size in bytes of the in-memory index (chunk text is memory-mapped)"""
+        vectordb = self.vectordb
+        if vectordb is None:
+            return 0
+        index = vectordb.index
+        if vector_index.is_mapped(index):
+            # Mapped vectors and links sit in the shared page cache; only the float32 tail is private
+            return (index.ntotal - vector_index.mapped_rows(index)) * index.d * 4
+        usage = index.ntotal * vector_index.bytes_per_vector(index)
+        if isinstance(index, faiss.IndexHNSW):
+            # Neighbour lists: about 2 * M int32 links per vector
+            usage += index.ntotal * self.index_params["M"] * 2 * 4
+        return usage
+    
+    @metrics.timed("save")
     def save_vectordb(self, path: str):
         """Save vector database to disk"""
         if self.vectordb is None:
             raise ValueError("No vector database to save")
         
         try:
-            self.vectordb.save_local(path)
-            logger.info(f"Vector database saved to {path}")
+            os.makedirs(path, exist_ok=True)
+            index_file = os.path.join(path, INDEX_FILE)
+            with self._index_lock:
+                self._unmap_index()
+                faiss.write_index(self.vectordb.index, index_file + ".tmp")
+                self.vectordb.docstore.save(path)
+                self.bm25.save(path)
+            os.replace(index_file + ".tmp", index_file)
+            # The full index now contains every segment
+            segments_dir = os.path.join(path, SEGMENTS_DIR)
+            if os.path.exists(segments_dir):
+                shutil.rmtree(segments_dir)
+            legacy_file = os.path.join(path, LEGACY_DOCSTORE_FILE)
+            if os.path.exists(legacy_file):
+                os.remove(legacy_file)
+            self._saved_count = self.vectordb.index.ntotal
+            self._full_save_needed = False
+            self._write_ingested(path)
+            self.index_version = self._write_version(path)
+            self._map_saved_index(path)
+            logger.info(f"Vector database saved to {path} (version {self.index_version})")
         except Exception as e:
             logger.error(f"Error saving vector database: {str(e)}")
             raise
     
+    def save_delta(self, path: str):
+        """Persist only the chunks added since the last save.
+        
+        New chunk text is appended to the chunk store and the new vectors and
+        BM25 postings are written as a small segment. Falls back to a full save_vectordb when
+        the index at path is not the one this store was saved to (or there is
+        none), when too many segments have accumulated, or when the index was
+        trained since the last save.
+        """
+        if self.vectordb is None:
+            raise ValueError("No vector database to save")
+        
+        segments = self._list_segments(path)
+        docstore = self.vectordb.docstore
+        if (docstore.path is None
+                or os.path.abspath(docstore.path) != os.path.abspath(path)
+                or not os.path.exists(os.path.join(path, INDEX_FILE))
+                or not BM25Index.exists(path)
+                or len(segments) >= MAX_SEGMENTS
+                or self._full_save_needed):
+            self.save_vectordb(path)
+            return
+        total = self.vectordb.index.ntotal
+        if total == self._saved_count:
+            return
+        
+        # Timed here rather than with a decorator, as the full save above times itself
+        with metrics.stage("save"):
+            try:
+                # The unsaved vectors are the tail of the live index (approximate for IVF-PQ,
+                # whose codes are re-derived from these vectors on load). Quantized storage
+                # decodes to values float16 holds exactly enough to re-encode the same codes.
+                segments_dir = os.path.join(path, SEGMENTS_DIR)
+                os.makedirs(segments_dir, exist_ok=True)
+                next_number = int(segments[-1].split(".")[0]) + 1 if segments else 0
+                segment_file = os.path.join(segments_dir, f"{next_number:06d}.npy")
+                with self._index_lock:
+                    embeddings = vector_index.reconstruct_n(
+                        self.vectordb.index, self._saved_count, total - self._saved_count
+                    )
+                    if self.storage != "float32":
+                        embeddings = embeddings.astype(np.float16)
+                    # Chunk text and postings first: rows without vectors are ignored when loading
+                    docstore.append_to(path)
+                    self.bm25.save_delta(self._bm25_segment_file(segment_file))
+                np.save(segment_file + ".tmp.npy", embeddings)
+                os.replace(segment_file + ".tmp.npy", segment_file)
+                self._saved_count = total
+                self._write_ingested(path)
+                self.index_version = self._write_version(path)
+                self._map_saved_index(path)
+                logger.info(f"Saved {len(embeddings)} new chunks as segment {next_number} in {path}")
+            except Exception as e:
+                logger.error(f"Error saving vector database delta: {str(e)}")
+                raise
+    
+    def _list_segments(self, path: str) -> List[str]:
+        """Return the segment file names under path in the order they were written"""
+        segments_dir = os.path.join(path, SEGMENTS_DIR)
+        if not os.path.exists(segments_dir):
+            return []
+        return sorted(
+            name for name in os.listdir(segments_dir)
+            if name.endswith(".npy") and name.split(".")[0].isdigit()
+        )
+    
+    def _bm25_segment_file(self, segment_file: str) -> str:
+        """BM25 postings saved alongside a vector segment"""
+        return segment_file[:-len(".npy")] + ".bm25.json"
+    
+    def _read_index(self, path: str, mapped: bool) -> faiss.Index:
+        """Read the base index at path and append every saved segment.
+        
+        A mapped base cannot be appended to, so its segments go into a small
+        in-memory flat index searched alongside it (vector_index.mapped_view).
+        """
+        index = vector_index.read_index(os.path.join(path, INDEX_FILE), mapped=mapped)
+        vector_index.apply_search_params(index, self.index_params)
+        tail = faiss.IndexFlatL2(index.d) if mapped else index
+        for name in self._list_segments(path):
+            tail.add(np.load(os.path.join(path, SEGMENTS_DIR, name)).astype(np.float32, copy=False))
+        # The view counts its rows when built, so the tail is filled first
+        return vector_index.mapped_view(index, tail) if mapped else index
+    
+    def _map_saved_index(self, path: str):
+        """In mmap mode, swap the index just saved at path for a mapped view of it"""
+        if not self.mmap:
+            return
+        index = self._read_index(path, mapped=True)
+        with self._index_lock:
+            # Only if nothing was appended since the save
+            if index.ntotal == self.vectordb.index.ntotal:
+                self.vectordb.index = index
+    
+    def _read_vectordb(self, path: str) -> FAISS:
+        """Read the index at path (mapped in mmap mode) with its segments and map the chunk store"""
+        saved_rows = ChunkStore.saved_count(path)
+        if saved_rows is None:
+            vectordb = self._read_legacy_vectordb(path)
+        else:
+            index = self._read_index(path, mapped=self.mmap)
+            if saved_rows < index.ntotal:
+                raise ValueError(f"Chunk store at {path} has {saved_rows} rows for {index.ntotal} vectors")
+            # Extra rows come from an interrupted save and are dropped
+            vectordb = ChunkStoreFAISS(self.embeddings, index, ChunkStore.open(path, index.ntotal),
+                                       RowIds(index.ntotal))
+        vector_index.apply_search_params(vectordb.index, self.index_params)
+        if not self.mmap:
+            # Mapped indexes are trained by the writer on its next upload, then saved and
+            # mapped again, instead of by every reader into private memory
+            self._maybe_train_index(vectordb)
+        return vectordb
+    
+    def _read_legacy_vectordb(self, path: str) -> FAISS:
+        """Read an index saved with a pickled docstore and move its chunks into a ChunkStore"""
+        legacy = FAISS.load_local(path, self.embeddings, allow_dangerous_deserialization=True)
+        store = ChunkStore()
+        count = legacy.index.ntotal
+        store.add({
+            str(i): legacy.docstore.search(legacy.index_to_docstore_id[i]) for i in range(count)
+        })
+        logger.info(f"Converted pickled docstore at {path}; it is rewritten on the next save")
+        return ChunkStoreFAISS(self.embeddings, legacy.index, store, RowIds(count))
+    
+    def _read_bm25(self, path: str, vectordb: FAISS) -> BM25Index:
+        """Map the BM25 index saved at path, or rebuild it from the chunk text if it is missing or stale"""
+        count = vectordb.index.ntotal
+        if BM25Index.exists(path):
+            segment_files = [
+                self._bm25_segment_file(os.path.join(path, SEGMENTS_DIR, name))
+                for name in self._list_segments(path)
+            ]
+            bm25 = BM25Index.load(path, [f for f in segment_files if os.path.exists(f)], count)
+            if bm25 is not None:
+                return bm25
+        
+        bm25 = BM25Index()
+        docs = vectordb.docstore.iter_documents()
+        while len(bm25) < count:
+            batch = [doc.page_content for doc in islice(docs, min(10000, count - len(bm25)))]
+            bm25.add(len(bm25), batch)
+        logger.info(f"Built BM25 index for {count} chunks at {path}; it is saved with the next full save")
+        return bm25
+    
+    @metrics.timed("load")
     def load_vectordb(self, path: str):
         """Load vector database from disk"""
         try:
-            self.vectordb = FAISS.load_local(path, self.embeddings, allow_dangerous_deserialization=True)
-            logger.info(f"Vector database loaded from {path}")
+            version = self.read_version(path)
+            vectordb = self._read_vectordb(path)
+            self.bm25 = self._read_bm25(path, vectordb)
+            self.vectordb = vectordb
+            self.ingested_files = self._read_ingested(path)
+            self.index_version = version
+            self._index_changed()
+            self._saved_count = self.vectordb.index.ntotal
+            logger.info(f"Vector database loaded from {path} (version {version})")
         except Exception as e:
             logger.error(f"Error loading vector database: {str(e)}")
             raise
     
+    def _read_ingested(self, path: str) -> dict:
+        """Read the hashes of PDFs already ingested into the index at path"""
+        try:
+            with open(os.path.join(path, INGESTED_FILE)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+    
+    def _write_ingested(self, path: str):
+        """Save the hashes of ingested PDFs next to the index"""
+        with open(os.path.join(path, INGESTED_FILE), "w") as f:
+            json.dump(self.ingested_files, f)
+    
+    def is_ingested(self, file_hash: str) -> bool:
+        """Check whether a PDF with this SHA-256 is already in the index"""
+        return file_hash in self.ingested_files
+    
+    def read_version(self, path: str) -> Optional[str]:
+        """Return the version stamp of the index saved at path, or None if there is none"""
+        try:
+            with open(os.path.join(path, VERSION_FILE)) as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            pass
+        # Indexes saved before version stamps existed fall back to the index file mtime
+        index_file = os.path.join(path, INDEX_FILE)
+        if os.path.exists(index_file):
+            return f"mtime-{os.stat(index_file).st_mtime_ns}"
+        return None
+    
+    def _write_version(self, path: str) -> str:
+        """Write a fresh version stamp next to the saved index"""
+        version = str(time.time_ns())
+        tmp_path = os.path.join(path, VERSION_FILE + ".tmp")
+        with open(tmp_path, "w") as f:
+            f.write(version)
+        # Atomic rename so readers never see a partially written stamp
+        os.replace(tmp_path, os.path.join(path, VERSION_FILE))
+        return version
+    
+    def refresh_vectordb(self, path: str, wait: bool = False):
+        """Make sure the in-memory index matches the one saved at path.
+        
+        The first call loads the index synchronously. Later calls are a cheap
+        stamp check; when the stamp changed, the new index is loaded in a
+        background thread and swapped in once ready, so queries keep using
+        the old index in the meantime. With wait, a changed index is loaded
+        before returning, as writers must append to the latest one.
+        """
+        version = self.read_version(path)
+        if version is None:
+            if self.index_version is not None:
+                # Saved before but gone now: another process cleared the collection
+                self.reset()
+            return
+        if version == self.index_version:
+            return
+        
+        if self.vectordb is None or wait:
+            with self._reload_lock:
+                if self._reload_thread is not None:
+                    self._reload_thread.join()
+            if self.read_version(path) != self.index_version:
+                self.load_vectordb(path)
+            return
+        
+        with self._reload_lock:
+            if self._reload_thread is not None and self._reload_thread.is_alive():
+                return
+            self._reload_thread = threading.Thread(
+                target=self._reload_vectordb, args=(path, version), daemon=True
+            )
+            self._reload_thread.start()
+    
+    @metrics.timed("load")
+    def _reload_vectordb(self, path: str, version: str):
+        """Load the index at path and swap it in (runs in a background thread)"""
+        try:
+            vectordb = self._read_vectordb(path)
+            bm25 = self._read_bm25(path, vectordb)
+            ingested_files = self._read_ingested(path)
+        except Exception as e:
+            logger.error(f"Error reloading vector database: {str(e)}")
+            return
+        # Reference swap: searches already running keep the old objects
+        with self._index_lock:
+            self.vectordb = vectordb
+            self.bm25 = bm25
+        self.ingested_files = ingested_files
+        self.index_version = version
+        self._index_changed()
+        self._saved_count = vectordb.index.ntotal
+        logger.info(f"Vector database reloaded from {path} (version {version})")
+    
     def similarity_search(self, query: str, k: int = 3) -> List[Document]:
         """Search for similar documents"""
-        if self.vectordb is None:
+        # Embed outside the index lock so only the lookup waits on ingestion
+        return self.similarity_search_by_vector(self.embeddings.embed_query(query), k=k)
+    
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 3) -> List[Document]:
+        """Search for documents similar to an already embedded query"""
+        vectordb = self.vectordb
+        if vectordb is None:
             raise ValueError("No vector database available")
         
         try:
-            docs = self.vectordb.similarity_search(query, k=k)
+            with self._index_lock:
+                docs = vectordb.similarity_search_by_vector(embedding, k=k)
             logger.info(f"Found {len(docs)} similar documents")
             return docs
         except Exception as e:
             logger.error(f"Error during similarity search: {str(e)}")
             raise
     
-    def process_pdf(self, pdf_path: str) -> bool:
-        """Complete pipeline: load PDF, create chunks, and build vector database"""
+    def similarity_search_batch(self, queries: List[str], k: int = 3) -> List[List[Tuple[Document, float]]]:
+        """Search for many queries at once: one embedding call and one FAISS search over the query matrix.
+        
+        Returns, per query, the top-k (document, distance) pairs, closest first.
+        """
+        vectordb = self.vectordb
+        if vectordb is None:
+            raise ValueError("No vector database available")
+        if not queries:
+            return []
+        
+        try:
+            matrix = np.asarray(self.embeddings.embed_documents(queries), dtype=np.float32)
+            if vectordb._normalize_L2:
+                faiss.normalize_L2(matrix)
+            with self._index_lock:
+                distances, indices = vectordb.index.search(matrix, k)
+            
+            results = []
+            for row_distances, row_indices in zip(distances, indices):
+                hits = []
+                for distance, i in zip(row_distances, row_indices):
+                    # FAISS pads with -1 when the index holds fewer than k vectors
+                    if i == -1:
+                        continue
+                    doc = vectordb.docstore.search(vectordb.index_to_docstore_id[i])
+                    hits.append((doc, float(distance)))
+                results.append(hits)
+            logger.info(f"Ran batch search for {len(queries)} queries")
+            return results
+        except Exception as e:
+            logger.error(f"Error during batch similarity search: {str(e)}")
+            raise
+    
+    def lexical_search(self, query: str, k: int = 3) -> List[Document]:
+        """Search by keywords alone, ranking chunks with BM25"""
+        vectordb = self.vectordb
+        if vectordb is None:
+            raise ValueError("No vector database available")
+        with self._index_lock:
+            hits = self.bm25.search(query, k)
+            return [vectordb.docstore.search(str(row)) for row, _ in hits]
+    
+    def hybrid_search(self, query: str, k: int = 3, candidates: int = 50, rrf_k: int = 60,
+                      embedding: Optional[List[float]] = None) -> List[Document]:
+        """Search with both BM25 and vectors and fuse the two rankings.
+        
+        Each retriever contributes its top candidates; a chunk scores
+        sum(1 / (rrf_k + rank)) over the rankings it appears in (reciprocal
+        rank fusion), so exact identifiers found by BM25 and paraphrases
+        found by the embeddings both make it into the top k. Pass embedding
+        if the query is already embedded.
+        """
+        vectordb = self.vectordb
+        if vectordb is None:
+            raise ValueError("No vector database available")
+        
         try:
-            # Load PDF
-            pages = self.load_pdf(pdf_path)
+            if embedding is None:
+                embedding = self.embeddings.embed_query(query)
+            matrix = np.asarray([embedding], dtype=np.float32)
+            if vectordb._normalize_L2:
+                faiss.normalize_L2(matrix)
+            candidates = max(candidates, k)
+            with self._index_lock:
+                _, vector_rows = vectordb.index.search(matrix, candidates)
+                keyword_rows = [row for row, _ in self.bm25.search(query, candidates)]
             
-            # Create chunks
-            chunks = self.create_chunks(pages)
+            scores = {}
+            for ranking in ([int(row) for row in vector_rows[0] if row != -1], keyword_rows):
+                for rank, row in enumerate(ranking):
+                    scores[row] = scores.get(row, 0.0) + 1.0 / (rrf_k + rank + 1)
+            top = sorted(scores, key=scores.get, reverse=True)[:k]
+            docs = [vectordb.docstore.search(str(row)) for row in top]
+            logger.info(f"Found {len(docs)} documents with hybrid search")
+            return docs
+        except Exception as e:
+            logger.error(f"Error during hybrid search: {str(e)}")
+            raise
+    
+    def process_pdf(self, pdf_path: str,
+                    progress: Optional[Callable[[str, int], None]] = None,
+                    file_hash: Optional[str] = None) -> bool:
+        """Complete pipeline: load PDF, create chunks, and add them to the vector database.
+        
+        progress, if given, is called with (stage, count) for "pages_loaded",
+        "chunks_created" and "chunks_embedded". file_hash, if given, is
+        recorded so the same file is not ingested twice. A PDF that fails
+        part way leaves none of its chunks in the index (see add_to_vectordb).
+        """
+        try:
+            # Pages are loaded, split and embedded lazily so memory stays flat
+            pages = self._count_progress(self.iter_pdf_pages(pdf_path), "pages_loaded", progress)
+            chunks = self._count_progress(self.iter_chunks(pages), "chunks_created", progress)
             
-            # Create vector database
-            self.create_vectordb(chunks)
+            # Append to the vector database, embedding only the new chunks
+            self.add_to_vectordb(chunks, progress=progress)
+            if file_hash:
+                self.ingested_files[file_hash] = os.path.basename(pdf_path)
+            logger.info(f"Processed {pdf_path}")
             
             return True
         except Exception as e:
             logger.error(f"Error processing PDF: {str(e)}")
             return False
     
-    def get_context(self, query: str, k: int = 3) -> str:
-        """Get relevant context for a query"""
+    def load_chunk_file(self, path: str, progress: Optional[Callable[[str, int], None]] = None,
+                        file_hash: Optional[str] = None, text_key: str = "content",
+                        max_chunk_chars: Optional[int] = None) -> int:
+        """Add pre-chunked records from a JSON array or JSON Lines file, e.g. all_devops_chunks.json.
+        
+        The file is streamed record by record, so its size does not matter.
+        Records no longer than max_chunk_chars (default: the splitter's chunk
+        size) are embedded as they are; only longer ones go through the text
+        splitter, since the embedding model truncates long inputs. Fields
+        other than text_key (id, title, source_doc, ...) are kept as
+        metadata. Returns the number of chunks added.
+        """
+        limit = max_chunk_chars or CHUNK_SIZE
+        
+        def chunks() -> Iterator[Document]:
+            for record in iter_json_records(path):
+                doc = record_to_document(record, text_key)
+                if len(doc.page_content) <= limit:
+                    yield doc
+                else:
+                    yield from self.text_splitter.split_documents([doc])
+        
+        try:
+            records = self._count_progress(chunks(), "chunks_created", progress)
+            self.add_to_vectordb(records, progress=progress)
+            if file_hash:
+                self.ingested_files[file_hash] = os.path.basename(path)
+            added = self.last_ingest_stats["chunks"]
+            logger.info(f"Loaded {added} chunks from {path}")
+            return added
+        except Exception as e:
+            logger.error(f"Error loading chunk file: {str(e)}")
+            raise
+    
+    def process_pdfs(self, pdf_paths: List[str],
+                     progress: Optional[Callable[[str, int], None]] = None,
+                     file_hashes: Optional[dict] = None, workers: Optional[int] = None) -> dict:
+        """Bulk pipeline: ingest many PDFs and add all their chunks to the index at once.
+        
+        Parsing and chunking fan out over a process pool (one PDF per task),
+        embedding is batched across documents, and the chunks of every PDF
+        that parsed are committed in a single step, so searches never see
+        half of a bulk upload. PDFs that fail to parse are skipped and
+        reported. progress, if given, is called with "files_processed",
+        "pages_loaded", "chunks_created" and "chunks_embedded" counts.
+        file_hashes maps paths to SHA-256 hashes to record as ingested.
+        """
+        started = time.perf_counter()
+        texts, metadatas, ingested, failed = [], [], [], {}
+        pages_loaded = 0
+        # Spawned workers do not inherit the server's threads and locks (fork could deadlock on them)
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), mp_context=context) as pool:
+            futures = {pool.submit(load_and_chunk, path): path for path in pdf_paths}
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    pages, chunks, load_seconds, split_seconds = future.result()
+                    metrics.STAGE_SECONDS.observe(load_seconds, stage="pdf_load")
+                    metrics.STAGE_SECONDS.observe(split_seconds, stage="split")
+                    ingested.append(path)
+                    pages_loaded += pages
+                    texts.extend(chunk.page_content for chunk in chunks)
+                    metadatas.extend(chunk.metadata for chunk in chunks)
+                except Exception as e:
+                    logger.error(f"Error loading PDF {path}: {str(e)}")
+                    metrics.STAGE_ERRORS.inc(stage="pdf_load")
+                    failed[path] = str(e)
+                if progress:
+                    progress("files_processed", len(ingested) + len(failed))
+                    progress("pages_loaded", pages_loaded)
+                    progress("chunks_created", len(texts))
+        parsed = time.perf_counter()
+        
+        if texts:
+            vectors = None
+            embedded = 0
+            for start, embeddings in self.embed_in_batches(texts):
+                if vectors is None:
+                    vectors = np.empty((len(texts), len(embeddings[0])), dtype=np.float32)
+                vectors[start:start + len(embeddings)] = embeddings
+                embedded += len(embeddings)
+                if progress:
+                    progress("chunks_embedded", embedded)
+            self._append(texts, vectors, metadatas)
+        for path in ingested:
+            if file_hashes and path in file_hashes:
+                self.ingested_files[file_hashes[path]] = os.path.basename(path)
+        
+        elapsed = time.perf_counter() - started
+        self.last_ingest_stats = {
+            "files": len(ingested),
+            "chunks": len(texts),
+            "seconds": round(elapsed, 3),
+            "parse_seconds": round(parsed - started, 3),
+            "chunks_per_second": round(len(texts) / elapsed, 1) if elapsed > 0 else None,
+            "batch_size": self.embed_batch_size,
+            "workers": self.embed_workers,
+        }
+        logger.info(f"Ingested {len(ingested)} PDFs ({len(texts)} chunks, {len(failed)} failed) in {elapsed:.1f}s")
+        return {"ingested": ingested, "failed": failed, "stats": self.last_ingest_stats}
+    
+    def _count_progress(self, items: Iterable, stage: str,
+                        progress: Optional[Callable[[str, int], None]]) -> Iterator:
+        """Pass items through, reporting the running count for stage"""
+        count = 0
+        for item in items:
+            count += 1
+            if progress:
+                progress(stage, count)
+            yield item
+    
+    def reset(self):
+        """Drop the in-memory vector database and any unsaved chunks"""
+        self.vectordb = None
+        self.bm25 = None
+        self.index_version = None
+        self.ingested_files = {}
+        self._index_changed()
+        self._saved_count = 0
+        self._full_save_needed = False
+    
+    def _index_changed(self):
+        """Invalidate everything derived from the current index contents"""
+        self._index_generation += 1
+        self.query_cache.clear()
+    
+    def get_context(self, query: str, k: int = 3, search_mode: str = "vector",
+                    token_budget: Optional[int] = None) -> str:
+        """Get relevant context for a query using one of SEARCH_MODES"""
+        return self.retrieve(query, k=k, search_mode=search_mode, token_budget=token_budget)[1]
+    
+    @metrics.timed("retrieve")
+    def retrieve(self, query: str, k: int = 3, search_mode: str = "vector",
+                 token_budget: Optional[int] = None) -> Tuple[Optional[List[float]], str]:
+        """Get relevant context for a query, plus the query embedding used (None in lexical mode).
+        
+        Without a token budget the context is the top k chunks. With one, up
+        to max(k, pack_candidates) chunks are packed into token_budget tokens.
+        """
         if self.vectordb is None:
-            return ""
+            return None, ""
+        if search_mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode {search_mode!r}; expected one of {SEARCH_MODES}")
         
         try:
-            docs = self.similarity_search(query, k=k)
-            context = "\n\n".join([doc.page_content for doc in docs])
-            return context
+            key = (" ".join(query.lower().split()), k, search_mode, token_budget, self._index_generation)
+            cached = self.query_cache.get(key)
+            if cached is not None:
+                metrics.CACHE_HITS.inc(cache="query")
+                return cached["embedding"], cached["context"]
+            metrics.CACHE_MISSES.inc(cache="query")
+            
+            if token_budget:
+                k = max(k, self.pack_candidates)
+            fetch_k = max(self.rerank_candidates, k) if self.reranker is not None else k
+            embedding = None
+            if search_mode != "lexical":
+                with metrics.stage("query_embed"):
+                    embedding = self.embeddings.embed_query(query)
+            with metrics.stage("search"):
+                if search_mode == "hybrid":
+                    docs = self.hybrid_search(query, k=fetch_k, embedding=embedding)
+                elif search_mode == "lexical":
+                    docs = self.lexical_search(query, k=fetch_k)
+                else:
+                    docs = self.similarity_search_by_vector(embedding, k=fetch_k)
+            metrics.CHUNKS_RETRIEVED.inc(len(docs))
+            reranked = True
+            if self.reranker is not None:
+                with metrics.stage("rerank"):
+                    docs, reranked = self.reranker.rerank(query, docs, k)
+            with metrics.stage("context_build"):
+                if token_budget:
+                    context, tokens = self.context_packer.pack(docs, token_budget)
+                    logger.info(f"Packed {len(docs)} chunks into {tokens} of {token_budget} context tokens")
+                else:
+                    context = "\n\n".join([doc.page_content for doc in docs])
+            # A fallback to retrieval order is not cached, so the next ask can still rerank
+            if reranked:
+                self.query_cache.put(key, {"embedding": embedding, "context": context})
+            return embedding, context
         except Exception as e:
             logger.error(f"Error getting context: {str(e)}")
-            return ""
+            return None, ""
@@ -0,0 +1,104 @@
+import logging
+import threading
+import time
+from typing import List, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+# While the estimate says even one batch overruns the budget, every this many
+# queries still score a batch so the estimate can recover
+PROBE_INTERVAL = 16
+
+
+class CrossEncoderReranker:
+    """Re-scores retrieved chunks against the query with a local cross-encoder.
+
+    Candidates are scored in batches under a latency budget. Scoring stops
+    and the candidates keep their retrieval order when the budget runs out,
+    or when the measured cost per pair says the next batch would overrun it.
+    """
+
+    def __init__(self, model_name: str = RERANK_MODEL, batch_size: int = 16,
+                 budget_ms: float = 150, model=None):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.budget_ms = budget_ms
+        # Anything with CrossEncoder.predict's signature; loaded on first use otherwise
+        self._model = model
+        self._load_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        # Moving average of scoring time per (query, chunk) pair
+        self._seconds_per_pair = None
+        self._skipped = 0
+        self.reranked = 0
+        self.fallbacks = 0
+
+    def _get_model(self):
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    from sentence_transformers import CrossEncoder
+                    self._model = CrossEncoder(self.model_name)
+                    logger.info(f"Loaded reranker {self.model_name}")
+        return self._model
+
+    def _record(self, pairs: int, seconds: float):
+        with self._stats_lock:
+            per_pair = seconds / pairs
+            if self._seconds_per_pair is None:
+                self._seconds_per_pair = per_pair
+            else:
+                self._seconds_per_pair = 0.8 * self._seconds_per_pair + 0.2 * per_pair
+
+    def rerank(self, query: str, docs: List[Document], k: int) -> Tuple[List[Document], bool]:
+        """Return the best k docs and whether they were reranked (False means retrieval order)"""
+        if len(docs) <= 1:
+            return docs[:k], True
+        model = self._get_model()
+        # The budget covers scoring only, not the one-off model load
+        deadline = time.perf_counter() + self.budget_ms / 1000
+
+        scores = []
+        for start in range(0, len(docs), self.batch_size):
+            batch = docs[start:start + self.batch_size]
+            if self._seconds_per_pair is not None and \
+                    time.perf_counter() + self._seconds_per_pair * len(batch) > deadline:
+                if start or self._skipped < PROBE_INTERVAL:
+                    self._skipped += 1
+                    return self._fall_back(docs, k, len(scores))
+            if not start:
+                self._skipped = 0
+            started = time.perf_counter()
+            scores.extend(model.predict(
+                [(query, doc.page_content) for doc in batch],
+                batch_size=self.batch_size, show_progress_bar=False
+            ))
+            self._record(len(batch), time.perf_counter() - started)
+            if time.perf_counter() > deadline and start + len(batch) < len(docs):
+                return self._fall_back(docs, k, len(scores))
+
+        order = np.argsort(-np.asarray(scores, dtype=np.float32), kind="stable")[:k]
+        with self._stats_lock:
+            self.reranked += 1
+        return [docs[i] for i in order], True
+
+    def _fall_back(self, docs: List[Document], k: int, scored: int) -> Tuple[List[Document], bool]:
+        with self._stats_lock:
+            self.fallbacks += 1
+        logger.info(f"Reranking stopped after {scored} of {len(docs)} candidates; using retrieval order")
+        return docs[:k], False
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "model": self.model_name,
+                "budget_ms": self.budget_ms,
+                "reranked": self.reranked,
+                "fallbacks": self.fallbacks,
+                "ms_per_pair": round(self._seconds_per_pair * 1000, 3)
+                if self._seconds_per_pair is not None else None,
+            }
@@ -0,0 +1,102 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+import numpy as np
+
+
+def context_hash(model: str, context: str) -> str:
+    """Identify the model and retrieved context an answer was generated from"""
+    return hashlib.sha256(f"{model}\0{context}".encode("utf-8")).hexdigest()
+
+
+class SemanticCache:
+    """Cache of LLM answers looked up by query embedding rather than exact text.
+
+    Each entry holds a normalised query embedding in a small inner-product
+    FAISS index, plus the hash of the context the answer was generated
+    from. A question hits when one of its nearest cached questions has
+    cosine similarity >= threshold and the same context hash, so a
+    paraphrase is answered from the cache but a changed index is not.
+    Entries expire after ttl_seconds; the oldest go first beyond max_entries.
+    """
+
+    def __init__(self, threshold: float = 0.95, max_entries: int = 1000,
+                 ttl_seconds: float = 3600, neighbours: int = 4):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.neighbours = neighbours
+        self.lookups = 0
+        self.hits = 0
+        self.saved_ms = 0.0
+        self._index = None
+        # id -> (expires_at, context hash, answer, generation ms), oldest first
+        self._entries = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def _vector(self, embedding: List[float]) -> np.ndarray:
+        # FAISS is imported on first use so creating the cache at startup stays cheap
+        import faiss
+        vector = np.asarray([embedding], dtype=np.float32)
+        faiss.normalize_L2(vector)
+        return vector
+
+    def get(self, embedding: List[float], context_key: str) -> Optional[str]:
+        """Return a cached answer for a similar question over the same context, or None"""
+        vector = self._vector(embedding)
+        with self._lock:
+            self.lookups += 1
+            if self._index is None or not self._entries:
+                return None
+            similarities, ids = self._index.search(vector, min(self.neighbours, len(self._entries)))
+            now = time.monotonic()
+            for similarity, entry_id in zip(similarities[0], ids[0]):
+                if entry_id == -1 or similarity < self.threshold:
+                    break
+                expires_at, entry_context, answer, generation_ms = self._entries[int(entry_id)]
+                if expires_at <= now:
+                    self._remove(int(entry_id))
+                    continue
+                if entry_context == context_key:
+                    self.hits += 1
+                    self.saved_ms += generation_ms
+                    return answer
+            return None
+
+    def put(self, embedding: List[float], context_key: str, answer: str, generation_ms: float):
+        """Cache answer for this question and context; generation_ms is what a later hit saves"""
+        vector = self._vector(embedding)
+        with self._lock:
+            if self._index is None:
+                import faiss
+                self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(vector.shape[1]))
+            entry_id = self._next_id
+            self._next_id += 1
+            self._index.add_with_ids(vector, np.array([entry_id], dtype=np.int64))
+            self._entries[entry_id] = (time.monotonic() + self.ttl_seconds, context_key, answer, generation_ms)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, entry_id: int):
+        self._index.remove_ids(np.array([entry_id], dtype=np.int64))
+        del self._entries[entry_id]
+
+    def clear(self):
+        with self._lock:
+            self._index = None
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_rate": round(self.hits / self.lookups, 3) if self.lookups else None,
+                "saved_ms": round(self.saved_ms, 1),
+                "threshold": self.threshold,
+            }
@@ -0,0 +1,164 @@
+"""Serve the API from pre-forked workers that share memory-mapped indexes (Unix only).
+
+Usage:
+    python serve.py --workers 4
+    python serve.py --host 0.0.0.0 --port 8000 --workers 8
+
+The master imports the heavy libraries (FAISS, numpy, langchain, FastAPI)
+once and forks the workers from it, so their code pages are shared
+copy-on-write. Workers map saved indexes read-only (SHARED_INDEX=1), so
+the vectors sit in the page cache once however many workers there are.
+
+Worker 0 is the writer: it runs the ingest jobs and every collection
+change. The other workers are readers; they forward uploads, job lookups
+and collection changes to the writer over a Unix socket (WRITER_SOCKET)
+and pick up new chunks on their next request, as they do after ingest.py.
+
+The embedding model loads in each worker after the fork, as the PyTorch
+and ONNX Runtime thread pools do not survive one. EMBEDDING_BACKEND=onnx
+with an int8 ONNX_MODEL_FILE keeps those per-worker copies small.
+Workers that die are restarted in the same role. Each worker shares its
+metrics through METRICS_DIR, so /metrics on any of them covers them all.
+"""
+import argparse
+import logging
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import time
+import traceback
+from typing import Dict
+
+logger = logging.getLogger("serve")
+
+# Imported by the master so every worker shares them. Not main: it opens the
+# embedding cache database and HTTP clients, which each worker needs its own of.
+PRELOADED_MODULES = ("rag_system", "fastapi", "uvicorn", "httpx")
+
+
+def bind_tcp(host: str, port: int, backlog: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def bind_unix(path: str, backlog: int) -> socket.socket:
+    if os.path.exists(path):
+        # Left over from a master that did not shut down cleanly
+        os.unlink(path)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(path)
+    os.chmod(path, 0o600)
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(number: int, tcp: socket.socket, writer: socket.socket, writer_socket: str, log_level: str):
+    """Serve main.app in a forked worker; worker 0 is the writer"""
+    import uvicorn
+
+    os.environ["SHARED_INDEX"] = "1"
+    if number == 0:
+        os.environ.pop("WRITER_SOCKET", None)
+        sockets = [tcp, writer]
+    else:
+        os.environ["WRITER_SOCKET"] = writer_socket
+        writer.close()
+        sockets = [tcp]
+    import main
+    config = uvicorn.Config(main.app, log_level=log_level)
+    uvicorn.Server(config).run(sockets=sockets)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="worker processes, including the writer (default: all cores)")
+    parser.add_argument("--writer-socket", default=".writer.sock", help="Unix socket readers reach the writer on")
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+    if not hasattr(os, "fork"):
+        sys.exit("serve.py needs fork(); run uvicorn main:app on this platform")
+    logging.basicConfig(level=args.log_level.upper())
+
+    started = time.perf_counter()
+    for module in PRELOADED_MODULES:
+        __import__(module)
+    logger.info(f"Preloaded {', '.join(PRELOADED_MODULES)} in {time.perf_counter() - started:.2f}s")
+
+    tcp = bind_tcp(args.host, args.port, args.backlog)
+    writer_socket = os.path.abspath(args.writer_socket)
+    writer = bind_unix(writer_socket, args.backlog)
+    # Fresh for every run, so counters start from zero like a single server's
+    metrics_dir = tempfile.mkdtemp(prefix="rag-metrics-")
+    os.environ["METRICS_DIR"] = metrics_dir
+    workers: Dict[int, int] = {}
+    stopping = False
+
+    def spawn(number: int):
+        pid = os.fork()
+        if pid == 0:
+            # Own process group, so a terminal Ctrl-C reaches workers once, via the master
+            os.setpgid(0, 0)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            code = 0
+            try:
+                run_worker(number, tcp, writer, writer_socket, args.log_level)
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+        workers[pid] = number
+        logger.info(f"Started {'writer' if number == 0 else 'reader'} worker {number} (pid {pid})")
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    for number in range(max(args.workers, 1)):
+        spawn(number)
+    logger.info(f"Serving on http://{args.host}:{args.port} with {len(workers)} workers")
+
+    try:
+        while workers:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            number = workers.pop(pid, None)
+            if number is None or stopping:
+                continue
+            logger.warning(f"Worker {number} (pid {pid}) exited with status {status}; restarting it")
+            # Don't spin if workers die on startup
+            time.sleep(1)
+            if not stopping:
+                spawn(number)
+    finally:
+        tcp.close()
+        writer.close()
+        if os.path.exists(writer_socket):
+            os.unlink(writer_socket)
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Local stand-in for the Gemini REST API, for testing and load-testing the backend offline.
+
+Usage:
+    python stub_gemini_server.py --port 8765 --latency-ms 50
+    GEMINI_API_ENDPOINT=http://127.0.0.1:8765 uvicorn main:app
+
+Serves models.list, generateContent and streamGenerateContent (?alt=sse).
+Answers echo the start of the prompt back in a few streamed chunks.
+"""
+import argparse
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MODELS = [
+    {"name": "models/gemini-2.0-flash", "supportedGenerationMethods": ["generateContent", "countTokens"]},
+    {"name": "models/gemini-1.5-flash", "supportedGenerationMethods": ["generateContent", "countTokens"]},
+    {"name": "models/text-embedding-004", "supportedGenerationMethods": ["embedContent"]},
+]
+
+
+def candidate(text: str) -> dict:
+    return {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}}]}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+    chunks = 4
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status: int, payload: dict):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.split("?")[0].rstrip("/").endswith("/models"):
+            self.send_json(200, {"models": MODELS})
+        else:
+            self.send_json(404, {"error": {"code": 404, "message": f"No route for {self.path}"}})
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if not self.headers.get("x-goog-api-key"):
+            self.send_json(403, {"error": {"code": 403, "message": "API key missing"}})
+            return
+        prompt = " ".join(
+            part.get("text", "") for content in request.get("contents", []) for part in content.get("parts", [])
+        )
+        answer = f"Stub answer to: {prompt.strip()[:80]}"
+        time.sleep(self.latency)
+
+        if ":streamGenerateContent" in self.path:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            step = max(len(answer) // self.chunks, 1)
+            for start in range(0, len(answer), step):
+                event = f"data: {json.dumps(candidate(answer[start:start + step]))}\r\n\r\n".encode()
+                self.wfile.write(f"{len(event):x}\r\n".encode() + event + b"\r\n")
+                self.wfile.flush()
+                time.sleep(self.latency / self.chunks)
+            self.wfile.write(b"0\r\n\r\n")
+        elif ":generateContent" in self.path:
+            self.send_json(200, candidate(answer))
+        else:
+            self.send_json(404, {"error": {"code": 404, "message": f"No route for {self.path}"}})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0, help="delay before answering each request")
+    parser.add_argument("--chunks", type=int, default=4, help="number of chunks per streamed answer")
+    args = parser.parse_args()
+
+    StubHandler.latency = args.latency_ms / 1000
+    StubHandler.chunks = args.chunks
+    server = ThreadingHTTPServer((args.host, args.port), StubHandler)
+    print(f"Stub Gemini API listening on http://{args.host}:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
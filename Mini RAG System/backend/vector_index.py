@@ -0,0 +1,265 @@
+import logging
+from typing import Optional
+
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+
+# How each vector is stored: as is, or as scalar-quantized codes
+STORAGE_TYPES = ("float32", "float16", "int8")
+
+SCALAR_QUANTIZERS = {
+    "float16": faiss.ScalarQuantizer.QT_fp16,
+    # One byte per dimension over each dimension's trained min..max range
+    "int8": faiss.ScalarQuantizer.QT_8bit,
+}
+
+# Vectors needed to learn the int8 ranges; values outside what training saw are clipped
+SQ_TRAIN_SIZE = 10000
+
+DEFAULT_INDEX_PARAMS = {
+    # IVF: number of inverted lists, and how many of them a search visits
+    "nlist": 256,
+    "nprobe": 16,
+    # IVF-PQ: sub-quantizers (must divide the dimension) and bits per code
+    "pq_m": 48,
+    "pq_nbits": 8,
+    # HNSW: graph degree and search / construction beam widths
+    "M": 32,
+    "efSearch": 64,
+    "efConstruction": 200,
+}
+
+# FAISS warns below 39 training points per centroid
+TRAINING_POINTS_PER_LIST = 39
+
+
+def index_params(params: Optional[dict] = None) -> dict:
+    """Fill in defaults for any index parameter not given"""
+    merged = dict(DEFAULT_INDEX_PARAMS)
+    merged.update(params or {})
+    return merged
+
+
+def check_storage(index_type: str, storage: str):
+    """Raise ValueError unless index_type can store its vectors as storage"""
+    if storage not in STORAGE_TYPES:
+        raise ValueError(f"Unknown storage {storage!r}; expected one of {STORAGE_TYPES}")
+    if storage == "float32":
+        return
+    if index_type == "ivf_pq":
+        raise ValueError("ivf_pq already compresses vectors; use float32 storage")
+
+
+def needs_training(index_type: str, storage: str = "float32") -> bool:
+    return index_type in ("ivf_flat", "ivf_pq") or storage == "int8"
+
+
+def train_size(index_type: str, params: dict, storage: str = "float32") -> int:
+    """Number of vectors required before an IVF or int8 index is trained"""
+    if not needs_training(index_type, storage):
+        return 0
+    if params.get("train_size"):
+        return params["train_size"]
+    size = SQ_TRAIN_SIZE if storage == "int8" else 0
+    if index_type in ("ivf_flat", "ivf_pq"):
+        centroids = params["nlist"]
+        if index_type == "ivf_pq":
+            # Each PQ sub-quantizer is a k-means over 2**pq_nbits centroids
+            centroids = max(centroids, 2 ** params["pq_nbits"])
+        size = max(size, centroids * TRAINING_POINTS_PER_LIST)
+    return size
+
+
+def create_index(index_type: str, dimension: int, params: dict, storage: str = "float32") -> faiss.Index:
+    """Create an empty, untrained FAISS index of the requested type and storage"""
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type {index_type!r}; expected one of {INDEX_TYPES}")
+    check_storage(index_type, storage)
+    qtype = SCALAR_QUANTIZERS.get(storage)
+
+    if index_type == "flat":
+        if qtype is not None:
+            index = faiss.IndexScalarQuantizer(dimension, qtype, faiss.METRIC_L2)
+        else:
+            index = faiss.IndexFlatL2(dimension)
+    elif index_type == "hnsw":
+        if qtype is not None:
+            index = faiss.IndexHNSWSQ(dimension, qtype, params["M"])
+        else:
+            index = faiss.IndexHNSWFlat(dimension, params["M"])
+        index.hnsw.efConstruction = params["efConstruction"]
+    else:
+        quantizer = faiss.IndexFlatL2(dimension)
+        if index_type == "ivf_flat" and qtype is not None:
+            index = faiss.IndexIVFScalarQuantizer(quantizer, dimension, params["nlist"], qtype, faiss.METRIC_L2)
+        elif index_type == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dimension, params["nlist"])
+        else:
+            index = faiss.IndexIVFPQ(quantizer, dimension, params["nlist"], params["pq_m"], params["pq_nbits"])
+    apply_search_params(index, params)
+    return index
+
+
+def build_trained_index(index_type: str, vectors: np.ndarray, params: dict,
+                        storage: str = "float32") -> faiss.Index:
+    """Create an index of the requested type and storage, train it on vectors and add them in order"""
+    index = create_index(index_type, vectors.shape[1], params, storage)
+    if needs_training(index_type, storage):
+        index.train(vectors)
+    if index_type in ("ivf_flat", "ivf_pq"):
+        # Row lookups (reconstruct) are needed to persist deltas
+        faiss.extract_index_ivf(index).make_direct_map()
+    index.add(vectors)
+    logger.info(f"Built {index_type} ({storage}) index over {len(vectors)} vectors")
+    return index
+
+
+def apply_search_params(index: faiss.Index, params: dict):
+    """Set query-time knobs (nprobe, efSearch); they are not all kept by write_index"""
+    try:
+        faiss.extract_index_ivf(index).nprobe = params["nprobe"]
+        return
+    except RuntimeError:
+        pass
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = params["efSearch"]
+
+
+def read_index(path: str, mapped: bool = False) -> faiss.Index:
+    """Read a saved index; mapped leaves its vectors in the file instead of copying them.
+
+    A mapped index is read-only (adding to it aborts the process) and its
+    pages live in the OS page cache, so every process mapping the same
+    file shares one copy.
+    """
+    if not mapped:
+        return faiss.read_index(path)
+    flag = getattr(faiss, "IO_FLAG_MMAP_IFC", None)
+    if flag is None:
+        logger.warning(f"This FAISS build cannot memory-map indexes; loading a private copy of {path}")
+        return faiss.read_index(path)
+    return faiss.read_index(path, flag | faiss.IO_FLAG_READ_ONLY)
+
+
+def mapped_view(index: faiss.Index, tail: faiss.Index) -> faiss.Index:
+    """Search a mapped index and an in-memory tail (rows saved after it) as one index.
+
+    Row ids run on from the mapped index into the tail. The view counts rows
+    when built, so after adding to the tail call syncWithSubIndexes. The
+    view is how a mapped index is told apart from a private one (see is_mapped).
+    """
+    shards = faiss.IndexShards(index.d, False, True)
+    shards.add_shard(index)
+    shards.add_shard(tail)
+    return shards
+
+
+def is_mapped(index: faiss.Index) -> bool:
+    return isinstance(index, faiss.IndexShards)
+
+
+def mapped_rows(index: faiss.Index) -> int:
+    """Number of rows whose vectors are mapped from the index file rather than held in memory"""
+    if not is_mapped(index):
+        return 0
+    return base_index(index).ntotal
+
+
+def base_index(index: faiss.Index) -> faiss.Index:
+    """The saved index inside a mapped_view, or index itself"""
+    if isinstance(index, faiss.IndexShards):
+        return faiss.downcast_index(index.at(0))
+    return index
+
+
+def tail_index(index: faiss.Index) -> faiss.Index:
+    """The in-memory flat index of a mapped_view, which takes every row added after the saved one.
+
+    Call index.syncWithSubIndexes() after adding to it, so the view counts the new rows.
+    """
+    return faiss.downcast_index(index.at(1))
+
+
+def reconstruct_n(index: faiss.Index, start: int, count: int) -> np.ndarray:
+    """index.reconstruct_n that also reads mapped views (IndexShards cannot reconstruct)"""
+    if not is_mapped(index):
+        return index.reconstruct_n(start, count)
+    parts = []
+    offset = 0
+    for shard in (base_index(index), tail_index(index)):
+        first = max(start - offset, 0)
+        last = min(start + count - offset, shard.ntotal)
+        if first < last:
+            parts.append(shard.reconstruct_n(first, last - first))
+        offset += shard.ntotal
+    return np.vstack(parts) if parts else np.empty((0, index.d), dtype=np.float32)
+
+
+def truncate(index: faiss.Index, count: int, params: dict) -> faiss.Index:
+    """Drop every row from count on, returning the index to use from then on.
+
+    Flat, scalar-quantized and IVF indexes remove the rows in place, as does
+    the in-memory tail of a mapped view (rows in its mapped file cannot be
+    removed). HNSW graphs cannot remove rows, so they are rebuilt from the
+    rows kept.
+    """
+    if count >= index.ntotal:
+        return index
+    if is_mapped(index):
+        rows = mapped_rows(index)
+        if count < rows:
+            raise ValueError(f"Rows before {rows} are in the mapped index file and cannot be removed")
+        tail_index(index).remove_ids(faiss.IDSelectorRange(count - rows, index.ntotal - rows))
+        index.syncWithSubIndexes()
+        return index
+    if isinstance(index, faiss.IndexHNSW):
+        return build_trained_index(describe_index(index), index.reconstruct_n(0, count), params,
+                                   describe_storage(index))
+    try:
+        ivf = faiss.extract_index_ivf(index)
+    except RuntimeError:
+        index.remove_ids(faiss.IDSelectorRange(count, index.ntotal))
+        return index
+    # The direct map (see build_trained_index) only removes rows as a hashtable, given their ids
+    ids = np.arange(count, index.ntotal, dtype=np.int64)
+    ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+    index.remove_ids(faiss.IDSelectorArray(len(ids), faiss.swig_ptr(ids)))
+    ivf.set_direct_map_type(faiss.DirectMap.Array)
+    return index
+
+
+def describe_index(index: faiss.Index) -> str:
+    """Short name of the index type actually in use"""
+    index = base_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, faiss.IndexIVF):
+        # IndexIVFFlat, or IndexIVFScalarQuantizer with float16 / int8 storage
+        return "ivf_flat"
+    return "flat"
+
+
+def describe_storage(index: faiss.Index) -> str:
+    """How the vectors of an index are actually stored"""
+    index = base_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        index = faiss.downcast_index(index.storage)
+    sq = getattr(index, "sq", None)
+    if sq is not None:
+        for storage, qtype in SCALAR_QUANTIZERS.items():
+            if sq.qtype == qtype:
+                return storage
+    return "float32"
+
+
+def bytes_per_vector(index: faiss.Index) -> int:
+    """Stored code size of one vector (excluding graph links or inverted list ids)"""
+    if isinstance(index, faiss.IndexHNSW):
+        return bytes_per_vector(faiss.downcast_index(index.storage))
+    return getattr(index, "code_size", None) or index.d * 4
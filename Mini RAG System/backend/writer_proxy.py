@@ -0,0 +1,76 @@
+import logging
+from typing import Optional
+
+import httpx
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response
+
+logger = logging.getLogger(__name__)
+
+# Requests that change collections or read job state, which only the writer process holds:
+# (method, path prefix)
+WRITE_ROUTES = (
+    ("POST", "/upload-pdf"),
+    ("GET", "/jobs/"),
+    ("POST", "/collections"),
+    ("DELETE", "/collections/"),
+    ("DELETE", "/clear-vectordb"),
+)
+# Headers that describe one connection and must not be copied to the next
+# (plus content-encoding, as httpx hands over decoded bodies)
+HOP_BY_HOP_HEADERS = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+    "te", "trailer", "transfer-encoding", "upgrade", "host", "content-length", "content-encoding",
+}
+
+
+def is_write_request(request: Request) -> bool:
+    path = request.url.path
+    return any(request.method == method and path.startswith(prefix) for method, prefix in WRITE_ROUTES)
+
+
+def _forwarded_headers(headers) -> dict:
+    return {name: value for name, value in headers.items() if name.lower() not in HOP_BY_HOP_HEADERS}
+
+
+class WriterProxy:
+    """Forward requests from a reader worker to the writer worker over a Unix socket.
+
+    Under serve.py only one worker builds and saves indexes and runs the
+    ingest jobs; the others serve queries from the shared, memory-mapped
+    indexes and hand every request in WRITE_ROUTES to it. Request bodies
+    (PDF uploads) are streamed through rather than buffered.
+    """
+
+    def __init__(self, socket_path: str, timeout: float = 300):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._http: Optional[httpx.AsyncClient] = None
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                transport=httpx.AsyncHTTPTransport(uds=self.socket_path),
+                base_url="http://writer",
+                timeout=self.timeout,
+            )
+        return self._http
+
+    async def forward(self, request: Request) -> Response:
+        """Send request to the writer and return its response"""
+        try:
+            response = await self.http.request(
+                request.method, request.url.path, params=request.query_params,
+                headers=_forwarded_headers(request.headers), content=request.stream(),
+            )
+        except httpx.TransportError as e:
+            logger.error(f"Writer at {self.socket_path} unreachable: {e}")
+            return JSONResponse({"detail": "Writer process unavailable"}, status_code=503)
+        return Response(response.content, status_code=response.status_code,
+                        headers=_forwarded_headers(response.headers))
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
@@ -66,6 +66,17 @@ function App() {
     }
   }
 
+  // Poll a background ingestion job until it finishes
+  const waitForJob = async (jobId) => {
+    while (true) {
+      const response = await axios.get(`${API_BASE}/jobs/${jobId}`)
+      const job = response.data
+      if (job.status === "completed") return job
+      if (job.status === "failed") throw new Error(job.error || "Processing failed")
+      await new Promise((resolve) => setTimeout(resolve, 1000))
+    }
+  }
+
   // Handle file upload
   const handleFileUpload = async (event) => {
     const file = event.target.files[0]
@@ -96,11 +107,16 @@ function App() {
       })
 
       if (response.data.success) {
+        if (response.data.job_id) {
+          await waitForJob(response.data.job_id)
+        }
         setMessages((prev) => [
           ...prev,
           {
             type: "system",
-            content: `✅ PDF "${file.name}" uploaded and processed successfully! You can now ask questions about the document.`,
+            content: response.data.duplicate
+              ? `✅ PDF "${file.name}" was already uploaded. You can ask questions about the document.`
+              : `✅ PDF "${file.name}" uploaded and processed successfully! You can now ask questions about the document.`,
             timestamp: new Date().toLocaleTimeString(),
           },
         ])
@@ -126,6 +142,41 @@ function App() {
     }
   }
 
+  // POST payload and call onEvent(event, data) for each server-sent event in the response
+  const streamEvents = async (url, payload, onEvent) => {
+    const response = await fetch(url, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify(payload),
+    })
+    if (!response.ok) {
+      const body = await response.json().catch(() => ({}))
+      throw new Error(body.detail || response.statusText)
+    }
+
+    const reader = response.body.getReader()
+    const decoder = new TextDecoder()
+    let buffer = ""
+    while (true) {
+      const { done, value } = await reader.read()
+      if (done) break
+      buffer += decoder.decode(value, { stream: true })
+      // Events are separated by a blank line
+      let boundary
+      while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+        const raw = buffer.slice(0, boundary)
+        buffer = buffer.slice(boundary + 2)
+        let event = "message"
+        let data = ""
+        for (const line of raw.split("\n")) {
+          if (line.startsWith("event: ")) event = line.slice(7)
+          else if (line.startsWith("data: ")) data += line.slice(6)
+        }
+        if (data) onEvent(event, JSON.parse(data))
+      }
+    }
+  }
+
   // Handle asking question
   const handleAsk = async () => {
     if (!input.trim()) return
@@ -139,35 +190,77 @@ function App() {
     setMessages((prev) => [...prev, userMessage])
     setIsLoading(true)
 
-    try {
-      const endpoint = useContext ? "/ask-with-context" : "/ask"
-      const payload = useContext
-        ? { message: input, use_context: useContext }
-        : { message: input }
-
-      const response = await axios.post(`${API_BASE}${endpoint}`, payload)
+    const question = input
+    const aiMessageId = Date.now()
+    let contextUsed = false
+    let started = false
 
-      const aiMessage = {
-        type: "ai",
-        content: response.data.response,
-        timestamp: new Date().toLocaleTimeString(),
-        contextUsed: response.data.context_used,
-        contextLength: response.data.context_length,
+    // Append streamed text to the AI message, creating it on the first token
+    const appendText = (text) => {
+      if (!started) {
+        started = true
+        setIsLoading(false)
+        setMessages((prev) => [
+          ...prev,
+          {
+            id: aiMessageId,
+            type: "ai",
+            content: text,
+            timestamp: new Date().toLocaleTimeString(),
+            contextUsed,
+            contextLength: 0,
+          },
+        ])
+        return
       }
+      setMessages((prev) =>
+        prev.map((message) =>
+          message.id === aiMessageId
+            ? { ...message, content: message.content + text }
+            : message
+        )
+      )
+    }
+
+    try {
+      const endpoint = useContext
+        ? "/ask-with-context/stream"
+        : "/ask/stream"
+      const payload = useContext
+        ? { message: question, use_context: useContext }
+        : { message: question }
+
+      let contextLength = 0
+      await streamEvents(`${API_BASE}${endpoint}`, payload, (event, data) => {
+        if (event === "context") {
+          contextUsed = data.context_used
+          contextLength = data.context_length
+        } else if (event === "error") {
+          throw new Error(data.error)
+        } else if (event === "message") {
+          appendText(data.text)
+        }
+      })
 
-      setMessages((prev) => [...prev, aiMessage])
+      setMessages((prev) =>
+        prev.map((message) =>
+          message.id === aiMessageId
+            ? { ...message, contextUsed, contextLength }
+            : message
+        )
+      )
 
       // Update stats
       setStats((prev) => ({
         totalMessages: prev.totalMessages + 1,
-        contextUsed: prev.contextUsed + (response.data.context_used ? 1 : 0),
+        contextUsed: prev.contextUsed + (contextUsed ? 1 : 0),
       }))
     } catch (error) {
       setMessages((prev) => [
         ...prev,
         {
           type: "error",
-          content: `❌ Error: ${error.response?.data?.error || error.message}`,
+          content: `❌ Error: ${error.message}`,
           timestamp: new Date().toLocaleTimeString(),
         },
       ])